@@ -1,11 +1,14 @@
 import sys
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, \
-    QLabel, QLineEdit, QTextEdit, QCheckBox, QGridLayout, QComboBox, QToolTip
+    QLabel, QLineEdit, QTextEdit, QCheckBox, QGridLayout, QComboBox, QToolTip, \
+    QCompleter
 from PyQt5.QtGui import QIcon, QFont
 from PyQt5.QtCore import *
-import snbt
+import complete
+import editor
+import jobs
+import rules
 import style
-import json
 
 class GUI(QWidget):
     def __init__(self):
@@ -14,56 +17,48 @@ class GUI(QWidget):
         self.initUI()
 
     def check_nbt(self):
-        snbt.Tag.strict = self.use_strict.isChecked()
-        try:
-            tag = snbt.TagCompound.parse(str(self.nbt_edit.text()).strip())
-            if tag[0]:
-                tag = tag[1]
-            else:
-                raise snbt.NbtException('Not Compound(Maybe there is no ending bracket).')
-            json_text = ''
-            with open('test.json','r') as file:
-                json_text = file.read()
-            snbt.check_compound_items(snbt.load_json(json_text), tag,\
-                str(self.base_list.currentText()))
-            self.output.setText('No problem!')
-        except snbt.NbtException as error:
-            self.output.setText(error.message)
-        except Exception as error:
-            self.output.setText(str(error))
+        self.worker.submit(jobs.check_nbt, self.document, str(self.nbt_edit.text()), \
+            str(self.base_list.currentText()), self.use_strict.isChecked())
 
     def show_availables(self):
-        try:
-            with open('test.json','r') as file:
-                json_text = file.read()
-                tags = snbt.load_json(json_text)
-            nbt = str(self.nbt_edit.text()).strip()
-            self.output.setText(json.dumps(tags[str(self.base_list.currentText())], \
-            sort_keys = True, indent = 4))
-            if len(nbt) > 0:
-                self.output.setText('Cannot find the requested NBT')
-                outputs = []
-                keys = list(tags[str(self.base_list.currentText())].keys())
-                keys.sort()
-                for key in keys:
-                    if nbt in key.lower():
-                        outputs.append('"%s": ' % key + json.dumps(\
-                        tags[str(self.base_list.\
-                        currentText())][key], sort_keys = True, indent = 4))
-                if len(outputs) > 0:
-                    self.output.setText(',\n'.join(outputs))
-
-        except Exception as error:
-            self.output.setText(str(error))
+        base_tag = str(self.base_list.currentText())
+        if self.search_all.isChecked():
+            base_tag = None
+        self.worker.submit(jobs.availables, str(self.nbt_edit.text()), base_tag)
 
     def show_nbt_tree(self):
+        self.worker.submit(jobs.nbt_tree, self.document, str(self.nbt_edit.text()))
+
+    def show_completions(self):
+        text = str(self.nbt_edit.text())
+        cursor = self.nbt_edit.cursorPosition()
         try:
-            tag = snbt.Tag.parse(str(self.nbt_edit.text()).strip())
-            self.output.setText(tag.tree())
-        except snbt.NbtException as error:
-            self.output.setText(error.message)
-        except Exception as error:
-            self.output.setText(str(error))
+            start, candidates = complete.Completer.of(rules.load('test.json')).complete(\
+                text, cursor, str(self.base_list.currentText()))
+        except Exception:
+            return
+        self.completion_start = start
+        if len(candidates) == 0:
+            self.completer.popup().hide()
+            return
+        self.completer.setModel(QStringListModel(candidates, self.completer))
+        self.completer.setCompletionPrefix(text[start:cursor])
+        self.completer.complete()
+
+    def insert_completion(self, candidate):
+        text = str(self.nbt_edit.text())
+        cursor = self.nbt_edit.cursorPosition()
+        self.nbt_edit.setText(text[:self.completion_start] + candidate + text[cursor:])
+        self.nbt_edit.setCursorPosition(self.completion_start + len(candidate))
+
+    def show_result(self, text, timing):
+        self.output.setText(text)
+        self.timing.setText(timing)
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        event.accept()
+
     def initUI(self):
         QToolTip.setFont(QFont('Arial', 10))
         self.setWindowIcon(QIcon('image/icon.ico'))
@@ -71,13 +66,20 @@ class GUI(QWidget):
         base_label = QLabel('Base tag:')
 
         self.nbt_edit = QLineEdit()
+        self.document = editor.Document()
+        self.worker = jobs.Worker()
+        self.worker.result.connect(self.show_result)
+        self.nbt_edit.textChanged.connect(self.check_nbt)
+        self.completion_start = 0
+        self.completer = QCompleter(self)
+        self.completer.setWidget(self.nbt_edit)
+        self.completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.completer.activated[str].connect(self.insert_completion)
+        self.nbt_edit.textEdited.connect(self.show_completions)
 
-        json_text = ''
         keys = []
         try:
-            with open('test.json','r') as file:
-                json_text = file.read()
-            keys = list(snbt.load_json(json_text).keys())
+            keys = list(rules.load('test.json').keys())
         except:
             exit()
         self.base_list = QComboBox()
@@ -93,6 +95,10 @@ class GUI(QWidget):
         self.use_strict.setToolTip("If true, it will check the type of the tags'+ \
             ' strictly.<br>For example, NoGravity:1 is not valid as 1 is int not byte.")
         self.output.setReadOnly(True)
+        self.search_all = QCheckBox('Search all base tags?')
+        self.search_all.setToolTip('If true, Show Tags searches the NBT in every base tag.')
+        self.timing = QLabel()
+        self.timing.setToolTip('Time taken by each stage of the last job.')
 
         availables_btn = QPushButton('Show Tags')
         availables_btn.clicked.connect(self.show_availables)
@@ -121,6 +127,9 @@ class GUI(QWidget):
         grid.addWidget(treebtn, 8, 2, 1, 1)
         grid.addWidget(generate, 8, 3, 1, 1)
 
+        grid.addWidget(self.search_all, 9, 0, 1, 2)
+        grid.addWidget(self.timing, 10, 0, 1, 4)
+
         self.setLayout(grid)
 
         self.setGeometry(400, 300, 600, 400)
@@ -0,0 +1,388 @@
+"""Benchmarks for snbt.
+
+Run all benchmarks:
+> python bench.py
+Run some of them:
+> python bench.py scalar"""
+
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+import cli
+import editor
+import snbt
+
+def entity(index):
+    return '{Pos:[%d.5d,64.0d,-%d.25d],Motion:[0.0d,-0.0784d,0.0d],' \
+        'Rotation:[%d.0f,-12.5f],FallDistance:0.0f,Fire:-1s,Air:300s,' \
+        'OnGround:1b,UUIDMost:%dl,UUIDLeast:-%dl,Attributes:[' \
+        '{Name:"generic.maxHealth",Base:20.0d},' \
+        '{Name:"generic.movementSpeed",Base:0.23000000417232513d},' \
+        '{Name:"generic.followRange",Base:35.0d,Modifiers:[{Name:"Random spawn bonus",' \
+        'Amount:-0.0431d,Operation:1,UUIDMost:%dl,UUIDLeast:%dl}]}]}' % \
+        ((index, ) * 7)
+
+def scalars(count):
+    """Scalar values of numeric heavy entity NBT (Pos, Motion, Rotation,
+    Attributes...)."""
+    result = []
+    def walk(tag):
+        if isinstance(tag, snbt.TagCompound):
+            for key in tag.keys():
+                walk(tag[key])
+        elif isinstance(tag, snbt.TagList):
+            for i in tag:
+                walk(i)
+        else:
+            result.append(str(tag))
+    for index in range(count):
+        walk(snbt.Tag.parse(entity(index)))
+    return result
+
+def report(name, seconds, count, unit):
+    print('%-28s %10.3f ms %10.3f us/%s' % \
+        (name, seconds * 1000, seconds * 1000000 / count, unit))
+
+def bench_scalar():
+    texts = scalars(200)
+    def by_class():
+        for text in texts:
+            for i in (snbt.TagByte, snbt.TagCompound, snbt.TagDouble, snbt.TagFloat, \
+                snbt.TagInt, snbt.TagList, snbt.TagLong, snbt.TagShort, snbt.TagString):
+                success, tag = i.parse(text)
+                if success:
+                    break
+    def by_first_char():
+        for text in texts:
+            snbt.Parser.parse_scalar(text)
+    report('scalar: try every class', min(timeit.repeat(by_class, number=1, repeat=5)), \
+        len(texts), 'scalar')
+    report('scalar: first char dispatch', \
+        min(timeit.repeat(by_first_char, number=1, repeat=5)), len(texts), 'scalar')
+
+def bench_check():
+    with open('dist/test.json', 'r') as file:
+        rules = snbt.load_json(file.read())
+    tags = [snbt.Tag.parse(entity(index)) for index in range(200)]
+    schema = snbt.CompiledSchema(rules)
+    def check():
+        for tag in tags:
+            snbt.check_compound_items(schema, tag, '<entity>')
+    report('check: compile schema', \
+        min(timeit.repeat(lambda: snbt.CompiledSchema(rules), number=1, repeat=5)), \
+        1, 'schema')
+    report('check: compiled schema', min(timeit.repeat(check, number=1, repeat=5)), \
+        len(tags), 'compound')
+
+def bench_cache():
+    with open('dist/test.json', 'r') as file:
+        schema = snbt.CompiledSchema(snbt.load_json(file.read()))
+    # the same few entities again and again, as in a map full of copies
+    cache = snbt.ValidationCache(1024)
+    tags = [snbt.Tag.parse(entity(index % 10), cache.pool) for index in range(500)]
+    def check(cache):
+        for tag in tags:
+            snbt.check_compound_items(schema, tag, '<entity>', cache)
+    report('cache: no cache', min(timeit.repeat(lambda: check(None), number=1, \
+        repeat=5)), len(tags), 'compound')
+    report('cache: ValidationCache', min(timeit.repeat(lambda: check(cache), number=1, \
+        repeat=5)), len(tags), 'compound')
+    print(cache.stats())
+
+def structure(count):
+    """Block list of a structure file, mostly the same few blocks."""
+    blocks = []
+    for index in range(count):
+        blocks.append('{pos:[%d,%d,%d],state:%d,nbt:{id:"minecraft:stone",' \
+            'Lock:"",powered:0b,conditionMet:0b}}' % \
+            (index % 32, index // 1024, index // 32 % 32, index % 3))
+    return '{size:[32,32,32],blocks:[%s]}' % ','.join(blocks)
+
+def measure(function):
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def bench_intern():
+    text = structure(20000)
+    for name, make in (('plain', lambda: None), ('scalars', lambda: snbt.Pool()), \
+        ('scalars + compounds', lambda: snbt.Pool(True))):
+        pool = make()
+        tag, size = measure(lambda: snbt.Tag.parse(text, pool))
+        seconds = min(timeit.repeat(lambda: snbt.Tag.parse(text, make()), \
+            number=1, repeat=3))
+        print('intern: %-20s %8.1f MB %10.3f ms%s' % (name, size / 1048576, \
+            seconds * 1000, '' if pool is None else ' %r' % pool.stats()))
+        del tag
+
+def bench_slots():
+    def build():
+        return snbt.TagList([snbt.TagCompound({'a': snbt.TagInt(index), \
+            'b': snbt.TagByte(0), 'c': snbt.TagDouble(0.5)}) for index in range(250000)])
+    tree, size = measure(build)
+    def read():
+        total = 0
+        for compound in tree.value:
+            value = compound.value
+            total += value['a'].value + value['b'].value + value['c'].value
+    seconds = min(timeit.repeat(read, number=1, repeat=5))
+    print('slots: 1M tags %8.1f MB, %6.1f ns per .value read' % \
+        (size / 1048576, seconds * 1000000000 / 1000000))
+
+def bench_arrays():
+    # a chunk of heightmaps and a long list of doubles, as in region files
+    texts = {'int array': '[I;%s]' % ','.join(str(i % 256) for i in range(65536)), \
+        'int list': '[%s]' % ','.join(str(i % 256) for i in range(65536)), \
+        'double list': '[%s]' % ','.join('%d.5d' % i for i in range(65536))}
+    for name, text in texts.items():
+        tag, size = measure(lambda: snbt.Tag.parse(text))
+        seconds = min(timeit.repeat(lambda: snbt.Tag.parse(text), number=1, repeat=3))
+        boxed, boxed_size = measure(lambda: snbt.TagList(list(tag)))
+        print('arrays: %-12s packed %7.1f KB, boxed %7.1f KB, parse %8.3f ms' % \
+            (name, size / 1024, boxed_size / 1024, seconds * 1000))
+        del tag, boxed
+
+def bench_ranges():
+    schema = snbt.CompiledSchema({'<chunk>': {\
+        'Heights': {'type': 'int array', 'range': {'min': 0, 'max': 255}}, \
+        'Levels': {'type': 'list', 'subtype': 'byte', 'count': 0, 'values': [0, 1, 2, 3]}, \
+        'Motion': {'type': 'list', 'subtype': 'double', 'count': 0, \
+        'range': {'min': -10, 'max': 10}}}})
+    packed = snbt.Tag.parse('{Heights:[I;%s],Levels:[%s],Motion:[%s]}' % \
+        (','.join(str(i % 256) for i in range(4096)), \
+        ','.join('%db' % (i % 4) for i in range(4096)), \
+        ','.join('%d.5d' % (i % 9) for i in range(4096))))
+    # the same tree with one Tag object per item, walked item by item
+    boxed = snbt.TagCompound({'Heights': snbt.TagList(list(packed['Heights'])), \
+        'Levels': snbt.TagList(list(packed['Levels'])), \
+        'Motion': snbt.TagList(list(packed['Motion']))})
+    for name, tag in (('item by item', boxed), ('packed', packed)):
+        seconds = min(timeit.repeat(lambda: snbt.check_compound_items(schema, tag, \
+            '<chunk>'), number=10, repeat=5)) / 10
+        report('ranges: ' + name, seconds, 3 * 4096, 'item')
+
+def bench_binary():
+    tag = snbt.Tag.parse(structure(20000))
+    text = str(tag)
+    data = snbt.dump_binary(tag, '', None)
+    compressed = snbt.dump_binary(tag)
+    for name, function in (('parse SNBT', lambda: snbt.Tag.parse(text)), \
+        ('read binary', lambda: snbt.load_binary(data)), \
+        ('read gzip binary', lambda: snbt.load_binary(compressed)), \
+        ('write gzip binary', lambda: snbt.dump_binary(tag))):
+        report('binary: ' + name, min(timeit.repeat(function, number=1, repeat=3)), \
+            20000, 'block')
+
+def region_file(path, count):
+    """Write a region file of 1024 chunks with count entities each."""
+    offsets = []
+    sectors = []
+    for index in range(1024):
+        chunk = snbt.Tag.parse('{Level:{xPos:%d,zPos:%d,Entities:[%s],TileEntities:[]}}' % \
+            (index % 32, index // 32, ','.join(entity(index * count + i) \
+            for i in range(count))))
+        data = snbt.dump_binary(chunk, '', 'zlib')
+        data = struct.pack('>IB', len(data) + 1, 2) + data
+        data += bytes(-len(data) % 4096)
+        offsets.append((2 + sum(len(i) for i in sectors) // 4096) << 8 | len(data) // 4096)
+        sectors.append(data)
+    with open(path, 'wb') as file:
+        file.write(struct.pack('>1024I', *offsets) + bytes(4096) + b''.join(sectors))
+
+def bench_region():
+    with open('dist/test.json', 'r') as file:
+        schema = snbt.CompiledSchema(snbt.load_json(file.read()))
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'r.0.0.mca')
+        region_file(path, 20)
+        def scan():
+            return sum(1 for i in cli.check_region(schema, path))
+        seconds = min(timeit.repeat(scan, number=1, repeat=3))
+        tracemalloc.start()
+        scan()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report('region: check 1024 chunks', seconds, 1024 * 20, 'entity')
+        print('region: file %.1f MB, peak traced memory %.1f MB' % \
+            (os.path.getsize(path) / 1048576, peak / 1048576))
+
+def bench_lazy():
+    texts = [entity(index) for index in range(10000)]
+    for name, lazy in (('full parse', False), ('lazy parse', True)):
+        def peek():
+            for text in texts:
+                tag = snbt.Tag.parse(text, lazy = lazy)
+                tag['OnGround'], tag['Pos'][0]
+        report('lazy: %s, read 2 keys' % name, \
+            min(timeit.repeat(peek, number=1, repeat=3)), len(texts), 'NBT')
+
+def bench_editor():
+    with open('dist/test.json', 'r') as file:
+        schema = snbt.CompiledSchema(snbt.load_json(file.read()))
+    # a 20 KB summon NBT, typing a new key in the Attributes of a passenger
+    text = entity(0)[:-1] + ',Passengers:[%s]}' % ','.join(entity(i) for i in range(1, 45))
+    index = text.index('{Name:"generic.maxHealth"', len(text) // 2) + 1
+    typed = [text[:index] + 'Fire:1s,'[:i] + text[index:] for i in range(1, 9)]
+    def full():
+        for text in typed:
+            snbt.collect_compound_errors(schema, snbt.Tag.parse(text), '<entity>')
+    def incremental():
+        document = editor.Document(text)
+        document.check(schema, '<entity>')
+        start = time.perf_counter()
+        for new in typed:
+            document.update(new)
+            document.check(schema, '<entity>')
+        return time.perf_counter() - start
+    print('editor: %d chars, %d keystrokes' % (len(text), len(typed)))
+    report('editor: parse and check all', min(timeit.repeat(full, number=1, repeat=5)), \
+        len(typed), 'key')
+    report('editor: Document.update', min(incremental() for i in range(5)), \
+        len(typed), 'key')
+
+def bench_writer():
+    deep = '{a:"x",b:[1,2],c:%s}'
+    text = '{}'
+    for depth in range(300):
+        text = deep % text
+    for name, tag in (('deep', snbt.Tag.parse(text)), \
+        ('wide', snbt.Tag.parse(structure(5000)))):
+        report('writer: str() %s' % name, min(timeit.repeat(lambda: str(tag), \
+            number=1, repeat=5)), 1, 'tree')
+        report('writer: tree() %s' % name, min(timeit.repeat(lambda: tag.tree(), \
+            number=1, repeat=5)), 1, 'tree')
+
+def bench_encode():
+    tag = snbt.Tag.parse(structure(20000))
+    def peak(function):
+        tracemalloc.start()
+        function()
+        size = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size
+    def stream():
+        with open(os.devnull, 'w') as file:
+            for chunk in snbt.iter_encode(tag):
+                file.write(chunk)
+    def whole():
+        with open(os.devnull, 'w') as file:
+            file.write(str(tag))
+    for name, function in (('str()', whole), ('iter_encode()', stream)):
+        print('encode: %-14s peak %7.1f MB %10.3f ms' % (name, peak(function) / 1048576, \
+            min(timeit.repeat(function, number=1, repeat=3)) * 1000))
+
+def bench_search():
+    import rules
+    tags = rules.load('dist/test.json').rules
+    index = rules.index('dist/test.json')
+    queries = ['a', 'fire', 'item', 'tion', 'custompotion', 'xyz']
+    def scan():
+        for nbt in queries:
+            outputs = []
+            for key in sorted(tags['<entity>'].keys()):
+                if nbt in key.lower():
+                    outputs.append('"%s": ' % key + json.dumps(tags['<entity>'][key], \
+                        sort_keys = True, indent = 4))
+    def search(base_tag):
+        for nbt in queries:
+            index.show(nbt, base_tag)
+    report('search: scan <entity>', min(timeit.repeat(scan, number=10, repeat=5)) / 10, \
+        len(queries), 'query')
+    report('search: index <entity>', min(timeit.repeat(lambda: search('<entity>'), \
+        number=10, repeat=5)) / 10, len(queries), 'query')
+    report('search: index all base tags', min(timeit.repeat(lambda: search(None), \
+        number=10, repeat=5)) / 10, len(queries), 'query')
+
+def bench_complete():
+    import complete
+    import rules
+    schema = rules.load('dist/test.json')
+    text = entity(0)[:-1] + ',Passengers:[%s' % ','.join(entity(i) for i in range(1, 45)) + \
+        ',{HandItems:[{id:"minecraft:stone"},{Cou'
+    completer = complete.Completer.of(schema)
+    report('complete: build table', min(timeit.repeat(lambda: complete.Completer(schema), \
+        number=1, repeat=5)), 1, 'schema')
+    report('complete: %d chars' % len(text), min(timeit.repeat(lambda: \
+        completer.complete(text, len(text), '<entity>'), number=10, repeat=5)) / 10, 1, \
+        'query')
+
+def bench_startup():
+    import rules
+    import subprocess
+    path = 'dist/test.json'
+    with open(path, 'rb') as file:
+        data = file.read()
+    tags = snbt.load_json(data.decode('utf-8'))
+    report('startup: read + json', min(timeit.repeat(lambda: \
+        snbt.load_json(open(path, 'rb').read().decode('utf-8')), number=10, repeat=5)) / 10, \
+        1, 'load')
+    report('startup: compile', min(timeit.repeat(lambda: snbt.CompiledSchema(tags), \
+        number=10, repeat=5)) / 10, 1, 'load')
+    for name, code in (('python', 'pass'), ('import rules', 'import rules'), \
+        ('import + load', 'import rules; rules.load(%r)' % path)):
+        command = [sys.executable, '-c', code]
+        def run():
+            subprocess.check_call(command, cwd = os.path.dirname(os.path.abspath(__file__)))
+        report('startup: process %s' % name, min(timeit.repeat(run, number=1, repeat=10)), \
+            1, 'process')
+
+def bench_imports():
+    # the budget itself is checked by test_imports.py
+    import test_imports
+    seconds, imported = test_imports.measure()
+    report('imports: %s' % ' '.join(test_imports.MODULES), seconds, 1, 'process')
+    if len(imported) > 0:
+        print('imports: %s imported' % ', '.join(imported))
+
+def bench_serve():
+    import subprocess
+    folder = os.path.dirname(os.path.abspath(__file__))
+    requests = [json.dumps({'nbt': entity(i), 'base': '<entity>', 'id': i}) \
+        for i in range(500)]
+    def spawn(count):
+        for i in range(count):
+            subprocess.run([sys.executable, 'cli.py', '--serve', '--rules', 'dist/test.json'], \
+                input = requests[i] + '\n', cwd = folder, check = True, \
+                stdout = subprocess.PIPE, universal_newlines = True)
+    def pipeline():
+        process = subprocess.Popen([sys.executable, 'cli.py', '--serve', '--rules', \
+            'dist/test.json'], cwd = folder, stdin = subprocess.PIPE, \
+            stdout = subprocess.PIPE, universal_newlines = True)
+        output = process.communicate('\n'.join(requests) + '\n')[0]
+        assert output.count('\n') == len(requests)
+    report('serve: process per request', min(timeit.repeat(lambda: spawn(10), \
+        number=1, repeat=3)) / 10, 1, 'request')
+    report('serve: one daemon, pipelined', min(timeit.repeat(pipeline, \
+        number=1, repeat=3)) / len(requests), 1, 'request')
+
+BENCHMARKS = {
+    'scalar': bench_scalar,
+    'check': bench_check,
+    'cache': bench_cache,
+    'intern': bench_intern,
+    'slots': bench_slots,
+    'arrays': bench_arrays,
+    'ranges': bench_ranges,
+    'binary': bench_binary,
+    'region': bench_region,
+    'lazy': bench_lazy,
+    'editor': bench_editor,
+    'writer': bench_writer,
+    'encode': bench_encode,
+    'search': bench_search,
+    'complete': bench_complete,
+    'startup': bench_startup,
+    'imports': bench_imports,
+    'serve': bench_serve,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
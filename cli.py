@@ -0,0 +1,322 @@
+"""Headless NBT checker for .mcfunction files.
+
+Check every command of a datapack(one JSON object per line on stdout):
+> python cli.py path/to/datapack
+Check with strict type checking and another rules file (the default is
+dist/test.json next to cli.py):
+> python cli.py --strict --rules my_rules.json a.mcfunction b.mcfunction
+Report every problem of each NBT instead of the first one (at most 100,
+or LIMIT with --limit LIMIT):
+> python cli.py --all path/to/datapack
+Skip compounds already checked, remembering up to 4096 of them:
+> python cli.py --cache 4096 path/to/datapack
+Check on every core:
+> python cli.py --jobs 0 path/to/datapack
+Check the entities and block entities of a world:
+> python cli.py path/to/world/region
+Keep running and answer one JSON request per line of stdin:
+> python cli.py --serve
+> {"nbt": "{Fire:1s}", "base": "<entity>", "strict": true, "id": 1}
+
+The NBT argument of summon, give, setblock, fill, data merge,
+entitydata, blockdata and replaceitem commands (also after
+'execute ... run') is checked against the base tag of the command.
+Entities and block entities in region (.mca) files are checked against
+<entity> and <block>, one result per tag.
+Exit status is 1 if any NBT is invalid.
+
+With --serve, the rules and the --cache stay loaded between requests,
+and a result line is written (and flushed) as soon as each request is
+checked, in the order of the requests. Clients may send many requests
+without waiting for the results."""
+
+import argparse
+import json
+import os
+import sys
+import region
+import rules
+import snbt
+
+RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dist', 'test.json')
+
+COMMANDS = {
+    'summon': '<entity>',
+    'give': '<tag>',
+    'replaceitem': '<tag>',
+    'setblock': '<block>',
+    'fill': '<block>',
+    'entitydata': '<entity>',
+    'blockdata': '<block>',
+    'data merge entity': '<entity>',
+    'data merge block': '<block>',
+}
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith('.mcfunction') or name.endswith('.mca'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def split_arguments(command):
+    """Split a command at spaces, keeping selectors such as
+    @e[nbt={a:"b c"}] and NBT arguments in one piece."""
+    arguments = []
+    index = 0
+    while index < len(command):
+        if command[index] == ' ':
+            index += 1
+            continue
+        start = index
+        brackets = 0
+        string = False
+        while index < len(command):
+            char = command[index]
+            if string:
+                if char == '\\':
+                    index += 1
+                elif char == '"':
+                    string = False
+            elif char == '"':
+                string = True
+            elif char == '{' or char == '[':
+                brackets += 1
+            elif char == '}' or char == ']':
+                brackets -= 1
+            elif char == ' ' and brackets <= 0:
+                break
+            index += 1
+        arguments.append((start, command[start:index]))
+    return arguments
+
+def find_nbt(command):
+    """Return (command name, base tag, index of the NBT) of a command, or
+    None if the command carries no NBT to check."""
+    arguments = split_arguments(command.lstrip('/'))
+    offset = len(command) - len(command.lstrip('/'))
+    while len(arguments) > 0 and arguments[0][1] == 'execute':
+        names = [i[1] for i in arguments]
+        if 'run' not in names:
+            return None
+        arguments = arguments[names.index('run') + 1:]
+    if len(arguments) == 0:
+        return None
+    name = arguments[0][1]
+    if name == 'data' and len(arguments) > 2 and arguments[1][1] == 'merge':
+        name = 'data merge ' + arguments[2][1]
+    if name not in COMMANDS:
+        return None
+    for start, argument in arguments[1:]:
+        if argument.startswith('@'):
+            continue
+        index = argument.find('{')
+        if index >= 0:
+            return name, COMMANDS[name], offset + start + index
+    return None
+
+def parse_nbt(command, index, pool = None):
+    """Parse the compound starting at command[index]. Malformed NBT goes
+    through Tag.parse for the rest of the command to get its error."""
+    parser = snbt.Parser(command, pool)
+    parser.index = index
+    try:
+        return parser.parse_container()
+    except snbt.Parser.Fallback:
+        pass
+    tag = snbt.Tag.parse(command[index:].strip(), pool)
+    if not isinstance(tag, snbt.TagCompound):
+        raise snbt.NbtException('Not Compound(Maybe there is no ending bracket).')
+    return tag
+
+def check_text(schema, text, base_tag, cache = None):
+    """Parse and check one NBT string, return None or the error message."""
+    try:
+        tag = snbt.Tag.parse(text.strip(), None if cache is None else cache.pool)
+    except snbt.NbtException as error:
+        return error.message
+    except Exception as error:
+        return str(error)
+    if not isinstance(tag, snbt.TagCompound):
+        return 'Not Compound(Maybe there is no ending bracket).'
+    return check(schema, tag, base_tag, cache)
+
+def check(schema, tag, base_tag, cache = None):
+    """Check a compound, return None or the error message."""
+    try:
+        snbt.check_compound_items(schema, tag, base_tag, cache)
+    except snbt.NbtException as error:
+        return error.message
+    except Exception as error:
+        return str(error)
+    return None
+
+def check_all(schema, tag, base_tag, limit):
+    """Check a compound, return the list of all problems as dicts."""
+    try:
+        return [i.to_dict() for i in \
+            snbt.collect_compound_errors(schema, tag, base_tag, limit)]
+    except Exception as error:
+        return [{'message': str(error), 'path': [], 'expected': None, 'actual': None, \
+            'rule': None}]
+
+def check_region(schema, path, limit = None, cache = None):
+    """Yield one result dict per entity and block entity of a region file,
+    or per chunk that cannot be read."""
+    with region.RegionFile(path) as file:
+        for chunk_index in file.indices():
+            x, z = file.position(chunk_index)
+            try:
+                chunk = file.chunk(chunk_index)
+                if not isinstance(chunk, snbt.TagCompound):
+                    raise snbt.NbtException('Chunk is not a compound')
+            except snbt.NbtException as error:
+                yield {'file': path, 'chunk': [x, z], 'error': error.message, 'ok': False}
+                continue
+            except Exception as error:
+                yield {'file': path, 'chunk': [x, z], 'error': str(error), 'ok': False}
+                continue
+            for key, index, base_tag, tag in region.entities(chunk):
+                result = {'file': path, 'chunk': [x, z], 'tag': key, 'index': index, \
+                    'id': tag['id'].value if 'id' in tag else None, 'base': base_tag}
+                if limit is None:
+                    result['error'] = check(schema, tag, base_tag, cache)
+                else:
+                    result['errors'] = check_all(schema, tag, base_tag, limit)
+                    result['error'] = None
+                    if len(result['errors']) > 0:
+                        result['error'] = result['errors'][0]['message']
+                result['ok'] = result['error'] is None
+                yield result
+
+def check_file(schema, path, limit = None, cache = None):
+    """Yield one result dict per checked command. With a limit, the result
+    also lists up to limit problems under 'errors'."""
+    if path.endswith('.mca'):
+        yield from check_region(schema, path, limit, cache)
+        return
+    with open(path, 'r', encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            command = line.strip()
+            if len(command) == 0 or command[0] == '#':
+                continue
+            found = find_nbt(command)
+            if found is None:
+                continue
+            name, base_tag, index = found
+            result = {'file': path, 'line': number, 'command': name, 'base': base_tag}
+            try:
+                tag = parse_nbt(command, index, None if cache is None else cache.pool)
+                if limit is None:
+                    result['error'] = check(schema, tag, base_tag, cache)
+                else:
+                    result['errors'] = check_all(schema, tag, base_tag, limit)
+                    result['error'] = None
+                    if len(result['errors']) > 0:
+                        result['error'] = result['errors'][0]['message']
+            except snbt.NbtException as error:
+                result['error'] = error.message
+            except Exception as error:
+                result['error'] = str(error)
+            result['ok'] = result['error'] is None
+            yield result
+
+def answer(schema, line, strict, limit = None, cache = None):
+    """Result dict of one request line of serve."""
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict) or not isinstance(request.get('nbt'), str):
+            raise ValueError('"nbt" must be a string')
+    except ValueError as error:
+        return {'error': 'Invalid request: %s' % error, 'ok': False}
+    result = {}
+    if 'id' in request:
+        result['id'] = request['id']
+    base_tag = request.get('base', '<entity>')
+    snbt.Tag.strict = bool(request.get('strict', strict))
+    if limit is None:
+        result['error'] = check_text(schema, request['nbt'], base_tag, cache)
+    else:
+        try:
+            tag = snbt.Tag.parse(request['nbt'].strip(), \
+                None if cache is None else cache.pool)
+            if not isinstance(tag, snbt.TagCompound):
+                raise snbt.NbtException('Not Compound(Maybe there is no ending bracket).')
+            result['errors'] = check_all(schema, tag, base_tag, limit)
+            result['error'] = None
+            if len(result['errors']) > 0:
+                result['error'] = result['errors'][0]['message']
+        except snbt.NbtException as error:
+            result['error'] = error.message
+        except Exception as error:
+            result['error'] = str(error)
+    result['ok'] = result['error'] is None
+    return result
+
+def serve(path, strict = False, limit = None, cache = None, input = None, output = None):
+    """Answer the requests of input (stdin) on output (stdout) until the
+    end of input."""
+    input = sys.stdin if input is None else input
+    output = sys.stdout if output is None else output
+    for line in iter(input.readline, ''):
+        if len(line.strip()) == 0:
+            continue
+        # the rules are only read again when the file changes
+        result = answer(rules.load(path), line, strict, limit, cache)
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Check NBT in .mcfunction files.')
+    parser.add_argument('paths', nargs = '*', \
+        help = '.mcfunction and .mca files or directories')
+    parser.add_argument('--rules', default = RULES, help = 'rules JSON file')
+    parser.add_argument('--strict', action = 'store_true', help = 'check types strictly')
+    parser.add_argument('--all', action = 'store_true', \
+        help = 'report all problems of each NBT instead of the first one')
+    parser.add_argument('--limit', type = int, default = 100, \
+        help = 'most problems reported for one NBT with --all')
+    parser.add_argument('--cache', type = int, default = 0, metavar = 'SIZE', \
+        help = 'remember the result of up to SIZE checked compounds')
+    parser.add_argument('--jobs', type = int, default = 1, \
+        help = 'number of worker processes, 0 for one per core')
+    parser.add_argument('--serve', action = 'store_true', \
+        help = 'check JSON requests from stdin, one per line, until it is closed')
+    args = parser.parse_args(argv)
+    limit = args.limit if args.all else None
+
+    if args.serve:
+        serve(args.rules, args.strict, limit, \
+            snbt.ValidationCache(args.cache) if args.cache > 0 else None)
+        return 0
+    if len(args.paths) == 0:
+        parser.error('the following arguments are required: paths')
+
+    if args.jobs == 1:
+        snbt.Tag.strict = args.strict
+        schema = rules.load(args.rules)
+        cache = snbt.ValidationCache(args.cache) if args.cache > 0 else None
+        results = (result for path in iter_files(args.paths) \
+            for result in check_file(schema, path, limit, cache))
+    else:
+        import parallel
+        results = parallel.check_files(list(iter_files(args.paths)), args.rules, \
+            args.strict, args.jobs or None, limit, args.cache)
+    failed = 0
+    for result in results:
+        if not result['ok']:
+            failed += 1
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+    if args.jobs != 1:
+        sys.stderr.write(parallel.last.report() + '\n')
+    elif cache is not None:
+        sys.stderr.write(json.dumps(cache.stats()) + '\n')
+    return 1 if failed > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Completion of NBT being typed, from the rules.
+
+Candidates at the cursor(return (start, list of strings)):
+> complete.Completer.of(rules.load('test.json')).complete(TEXT, CURSOR, '<entity>')
+
+TEXT[start:CURSOR] is the part of a key or value already typed, to be
+replaced by the chosen candidate: 'Key:' for a key of the compound at
+the cursor, or one of the values of the rule of the key (or list) the
+value is typed for, in quotes if the typed part starts with one. The
+text before the cursor is only split into brackets, separators and
+strings, and the base tag of every bracket is looked up in a table made
+once per rules file."""
+
+import re
+import snbt
+
+class Completer:
+    token = re.compile(r'"(?:[^"\\]|\\.)*"?|[{}\[\],:]')
+    def __init__(self, schema):
+        self.schema = schema
+        # base tag -> sorted keys, (base tag, key) -> (base tag of a compound
+        # value or of the compound items of a list, values to complete)
+        self.keys = {}
+        self.children = {}
+        for base_tag, plan in schema.plans.items():
+            self.keys[base_tag] = sorted(plan)
+            for key, rule in plan.items():
+                child = None
+                if rule.tag_type is snbt.TagCompound:
+                    child = rule.type
+                elif rule.tag_type is snbt.TagList and rule.item_type is snbt.TagCompound:
+                    child = rule.subtype
+                values = ()
+                if rule.values is not None:
+                    values = sorted(str(i) for i in rule.values)
+                self.children[(base_tag, key)] = (child, values)
+    last = None
+    def of(schema):
+        """Completer of a CompiledSchema, reused while the same one is passed."""
+        if Completer.last is None or Completer.last.schema is not schema:
+            Completer.last = Completer(schema)
+        return Completer.last
+    def complete(self, text, cursor, base_tag):
+        # frames of the open brackets: [opener, base tag, key, start, keys]
+        # where key is None while a key of a compound is typed, and start is
+        # where the current key or value begins
+        stack = []
+        for match in Completer.token.finditer(text, 0, cursor):
+            char = match.group()
+            if char == '{' or char == '[':
+                if len(stack) == 0:
+                    base = base_tag if char == '{' else None
+                    child = (None, ())
+                else:
+                    child = self.child(stack[-1])
+                    base = child[0]
+                stack.append([char, base, None, match.end(), set(), child[1]])
+            elif char == '}' or char == ']':
+                if len(stack) > 0:
+                    stack.pop()
+            elif len(stack) == 0:
+                continue
+            elif char == ':':
+                frame = stack[-1]
+                if frame[0] == '{' and frame[2] is None:
+                    frame[2] = text[frame[3]:match.start()].strip()
+                    frame[4].add(frame[2])
+                    frame[3] = match.end()
+            elif char == ',':
+                frame = stack[-1]
+                if frame[0] == '{':
+                    frame[2] = None
+                frame[3] = match.end()
+        if len(stack) == 0:
+            return cursor, []
+        frame = stack[-1]
+        start = frame[3]
+        while start < cursor and text[start].isspace():
+            start += 1
+        typed = text[start:cursor]
+        if frame[0] == '{' and frame[2] is None:
+            typed = typed.lower()
+            return start, [key + ':' for key in self.keys.get(frame[1], ()) \
+                if key.lower().startswith(typed) and key not in frame[4]]
+        if frame[0] == '{':
+            values = self.children.get((frame[1], frame[2]), (None, ()))[1]
+        else:
+            values = frame[5]
+        if typed.startswith('"'):
+            # a quoted value, completed with its closing quote
+            typed = typed[1:].replace('\\"', '"').replace('\\\\', '\\')
+            return start, ['"%s"' % i.replace('\\', '\\\\').replace('"', '\\"') \
+                for i in values if i.startswith(typed)]
+        return start, [i for i in values if i.startswith(typed)]
+    def child(self, frame):
+        """(base tag, values) of a bracket opened inside the frame."""
+        if frame[0] == '[':
+            return frame[1], ()
+        if frame[2] is None:
+            return None, ()
+        return self.children.get((frame[1], frame[2]), (None, ()))
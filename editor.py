@@ -0,0 +1,214 @@
+"""Incremental parse and check of NBT text being edited.
+
+Keep the parse tree of a text(return Document):
+> document = editor.Document(TEXT)
+----------------------------------------------------------
+After every change of the text(the tree is updated in place):
+> document.update(NEW_TEXT)
+----------------------------------------------------------
+All problems(return list of snbt.Diagnostic, raise the
+NbtException of the text if it cannot be parsed):
+> document.check(rules.load('test.json'), '<entity>')
+
+Every compound and list of the tree remembers where it is in the text.
+An edit inside one of them only parses that innermost compound or list
+again, and the next check only collects the problems of the innermost
+compound around it. Anything else (edits of the outer brackets, text
+Parser cannot handle...) parses and checks the whole text again."""
+
+import snbt
+
+class Document:
+    def __init__(self, text = ''):
+        self.text = text
+        self.tag = None
+        self.error = None
+        self.nodes = []
+        self.errors = None
+        self.checked = None
+        self.dirty = None
+        self.parsed = 0
+        self.parse()
+    def parse(self):
+        """Parse the whole text."""
+        self.tag = None
+        self.error = None
+        self.nodes = []
+        self.dirty = None
+        self.checked = None
+        self.parsed += len(self.text)
+        text = self.text.strip()
+        lead = len(self.text) - len(self.text.lstrip())
+        parser = snbt.Parser(text)
+        parser.spans = []
+        try:
+            try:
+                self.tag = parser.parse()
+            except snbt.Parser.Fallback:
+                self.tag = snbt.Tag.parse(text)
+                return
+        except snbt.NbtException as error:
+            self.error = error
+            return
+        except Exception as error:
+            self.error = snbt.NbtException(str(error))
+            return
+        if isinstance(self.tag, (snbt.TagCompound, snbt.TagList, snbt.TagArray)):
+            parser.spans.append((0, len(text), self.tag))
+            self.nodes = sorted([start + lead, end + lead, tag] \
+                for start, end, tag in parser.spans)
+    def update(self, text):
+        """Replace the text, as one edit of the part that changed."""
+        if text == self.text:
+            return
+        limit = min(len(text), len(self.text))
+        start = Document.common(text, self.text, limit, False)
+        end = Document.common(text, self.text, limit - start, True)
+        self.edit(start, len(self.text) - end, text[start:len(text) - end])
+    def common(a, b, limit, suffix):
+        """Length of the common prefix (or suffix) of two strings, at most
+        limit, found by comparing slices instead of characters."""
+        low = 0
+        high = limit
+        while low < high:
+            middle = (low + high + 1) // 2
+            if suffix:
+                same = a[len(a) - middle:] == b[len(b) - middle:]
+            else:
+                same = a[:middle] == b[:middle]
+            if same:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+    def edit(self, start, end, text):
+        """Replace self.text[start:end] with text."""
+        self.text = self.text[:start] + text + self.text[end:]
+        delta = len(text) - (end - start)
+        node = None
+        for i in self.nodes:
+            if i[0] < start and end < i[1] and (node is None or i[0] > node[0]):
+                node = i
+        if node is None:
+            return self.parse()
+        parser = snbt.Parser(self.text)
+        parser.spans = []
+        parser.index = node[0]
+        try:
+            tag = parser.parse_container()
+        except (snbt.Parser.Fallback, snbt.NbtException):
+            return self.parse()
+        if parser.index != node[1] + delta:
+            return self.parse()
+        self.parsed += parser.index - node[0]
+
+        chain = [i for i in self.nodes if i[0] <= node[0] and node[1] <= i[1]]
+        path = []
+        for parent, child in zip(chain, chain[1:]):
+            path.append(Document.key(parent[2], child[2]))
+        if len(path) == 0:
+            self.tag = tag
+        else:
+            chain[-2][2][path[-1]] = tag
+        nodes = []
+        for i in self.nodes:
+            if i[1] <= node[0]:
+                nodes.append(i)
+            elif i[0] >= node[1]:
+                nodes.append([i[0] + delta, i[1] + delta, i[2]])
+            elif i[0] < node[0]:
+                nodes.append([i[0], i[1] + delta, i[2]])
+        parser.spans.append((node[0], parser.index, tag))
+        nodes.extend([start, end, tag] for start, end, tag in parser.spans)
+        nodes.sort(key = lambda i: i[0])
+        self.nodes = nodes
+
+        # the innermost compound around the change is checked again
+        while len(path) > 0 and not isinstance(tag, snbt.TagCompound):
+            path.pop()
+            chain.pop()
+            tag = chain[-1][2]
+        if self.dirty is not None:
+            length = 0
+            while length < min(len(self.dirty), len(path)) and \
+                self.dirty[length] == path[length]:
+                length += 1
+            path = path[:length]
+        self.dirty = path
+    def key(parent, child):
+        """Key or index of a child tag in its compound or list."""
+        if isinstance(parent, snbt.TagCompound):
+            for key, tag in parent.value.items():
+                if tag is child:
+                    return key
+        for index, tag in enumerate(parent.value):
+            if tag is child:
+                return index
+        raise KeyError('Not a child')
+    def position(tag, path):
+        """Order of a path in a walk of the tree, as a tuple."""
+        result = []
+        for key in path:
+            if isinstance(key, str):
+                if not isinstance(tag, snbt.TagCompound) or key not in tag:
+                    break
+                result.append(list(tag.keys()).index(key))
+            else:
+                result.append(key)
+            tag = tag[key]
+        return tuple(result)
+    def base_of(schema, compound, base_tag, path):
+        """Base tag the compound at path is checked against, or None if the
+        check would not reach it (or not as a compound of known rules)."""
+        tag = compound
+        index = 0
+        while index < len(path):
+            if base_tag not in schema.plans or path[index] not in schema.plans[base_tag]:
+                return None
+            rule = schema.plans[base_tag][path[index]]
+            tag = tag[path[index]]
+            if rule.union or not tag.type_match(rule.tag_type):
+                return None
+            if rule.tag_type is snbt.TagCompound:
+                base_tag = rule.type
+                index += 1
+            elif rule.tag_type is snbt.TagList and rule.item_type is snbt.TagCompound and \
+                index + 1 < len(path):
+                tag = tag[path[index + 1]]
+                if not tag.type_match(snbt.TagCompound):
+                    return None
+                base_tag = rule.subtype
+                index += 2
+            else:
+                return None
+        return base_tag if base_tag in schema.plans else None
+    def check(self, schema, base_tag, limit = 100):
+        if self.error is not None:
+            raise self.error
+        if not isinstance(schema, snbt.CompiledSchema):
+            schema = snbt.CompiledSchema.of(schema)
+        if not isinstance(self.tag, snbt.TagCompound):
+            raise snbt.NbtException('Not Compound(Maybe there is no ending bracket).')
+        checked = (schema, base_tag, snbt.Tag.strict, limit)
+        path = self.dirty
+        if self.checked is not None and checked[0] is self.checked[0] and \
+            checked[1:] == self.checked[1:] and path is not None and len(path) > 0 and \
+            len(self.errors) < limit:
+            base = Document.base_of(schema, self.tag, base_tag, path)
+            if base is not None:
+                tag = self.tag
+                for key in path:
+                    tag = tag[key]
+                errors = [i for i in self.errors if not \
+                    (len(i.path) > len(path) and i.path[:len(path)] == path)]
+                schema.collect(tag, base, list(path), errors, limit)
+                if len(errors) < limit:
+                    # in the order collect_compound_errors finds them
+                    errors.sort(key = lambda i: Document.position(self.tag, i.path))
+                    self.errors = errors
+                    self.dirty = None
+                    return self.errors
+        self.errors = snbt.collect_compound_errors(schema, self.tag, base_tag, limit)
+        self.checked = checked
+        self.dirty = None
+        return self.errors
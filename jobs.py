@@ -0,0 +1,109 @@
+"""Work of the GUI, run on a background thread.
+
+Run a job(SLOT(text, timing) is called on the GUI thread):
+> worker = jobs.Worker()
+> worker.result.connect(SLOT)
+> worker.submit(jobs.check_nbt, DOCUMENT, TEXT, BASE_TAG, STRICT)
+
+Jobs run one at a time on a QThreadPool of one thread, in the order
+they are submitted, so the Document of a GUI is never used by two
+threads. Submitting a job cancels the older ones: those not started are
+dropped, a running one stops at its next stage, and results of old jobs
+are never sent."""
+
+import time
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+import rules
+import snbt
+
+class Cancelled(Exception):
+    pass
+
+class Job(QRunnable):
+    def __init__(self, worker, generation, function, args):
+        super().__init__()
+        self.worker = worker
+        self.generation = generation
+        self.function = function
+        self.args = args
+        self.timing = []
+        self.name = None
+        self.start = None
+    def stage(self, name = None):
+        """End the current stage and start the next one (None for the last)."""
+        now = time.perf_counter()
+        if self.name is not None:
+            self.timing.append('%s %.1f ms' % (self.name, (now - self.start) * 1000))
+        if self.generation != self.worker.generation:
+            raise Cancelled()
+        self.name = name
+        self.start = now
+    def run(self):
+        try:
+            self.stage()
+            try:
+                text = self.function(self.stage, *self.args)
+            except snbt.NbtException as error:
+                text = error.message
+            except Cancelled:
+                raise
+            except Exception as error:
+                text = str(error)
+            self.stage()
+        except Cancelled:
+            return
+        self.worker.done.emit(self.generation, text, ', '.join(self.timing))
+
+class Worker(QObject):
+    done = pyqtSignal(int, str, str)
+    result = pyqtSignal(str, str)
+    def __init__(self):
+        super().__init__()
+        self.generation = 0
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.done.connect(self.send)
+    def submit(self, function, *args):
+        """Run function(stage, *args) on the worker thread. It returns the
+        text to show, and calls stage(name) before each of its stages."""
+        self.cancel()
+        self.pool.start(Job(self, self.generation, function, args))
+    def cancel(self):
+        self.generation += 1
+        self.pool.clear()
+    def send(self, generation, text, timing):
+        if generation == self.generation:
+            self.result.emit(text, timing)
+    def stop(self):
+        self.cancel()
+        self.pool.waitForDone()
+
+def check_nbt(stage, document, text, base_tag, strict):
+    if len(text.strip()) == 0:
+        return ''
+    stage('parse')
+    document.update(text)
+    stage('load rules')
+    schema = rules.load('test.json')
+    stage('check')
+    snbt.Tag.strict = strict
+    errors = document.check(schema, base_tag)
+    stage('format')
+    if len(errors) > 0:
+        return '\n\n'.join(str(i) for i in errors)
+    return 'No problem!'
+
+def nbt_tree(stage, document, text):
+    stage('parse')
+    document.update(text)
+    if document.error is not None:
+        raise document.error
+    stage('tree')
+    return document.tag.tree()
+
+def availables(stage, nbt, base_tag):
+    """Show Tags, in base_tag or in every base tag if None."""
+    stage('load rules')
+    index = rules.index('test.json')
+    stage('search')
+    return index.show(nbt, base_tag)
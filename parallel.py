@@ -0,0 +1,75 @@
+"""Check NBT on all cores with a process pool.
+
+Check NBT strings(yield None or the error message, in input order):
+> for error in parallel.check_texts(TEXTS, '<entity>', 'test.json'):
+>     pass
+----------------------------------------------------------
+Check .mcfunction files(yield the results of cli.check_file):
+> for result in parallel.check_files(PATHS, 'test.json'):
+>     pass
+----------------------------------------------------------
+Throughput of the last run(return string):
+> parallel.last.report()
+
+Every worker loads the rules file once, when it starts, and checks with
+the same Tag.parse and check_compound_items as the serial path. With
+cache_size > 0, every worker keeps its own snbt.ValidationCache."""
+
+import multiprocessing
+import time
+import cli
+import rules
+import snbt
+
+schema = None
+cache = None
+
+class Throughput:
+    def __init__(self, unit):
+        self.unit = unit
+        self.count = 0
+        self.start = time.perf_counter()
+        self.end = self.start
+    def add(self, count = 1):
+        self.count += count
+        self.end = time.perf_counter()
+    def report(self):
+        seconds = self.end - self.start
+        return '%d %s in %.3f s (%.1f %s/s)' % (self.count, self.unit, seconds, \
+            self.count / seconds if seconds > 0 else 0, self.unit)
+
+last = None
+
+def init_worker(path, strict, cache_size):
+    global schema, cache
+    snbt.Tag.strict = strict
+    schema = rules.load(path)
+    if cache_size > 0:
+        cache = snbt.ValidationCache(cache_size)
+
+def check_text(item):
+    return cli.check_text(schema, item[0], item[1], cache)
+
+def check_file(item):
+    return list(cli.check_file(schema, item[0], item[1], cache))
+
+def check_texts(texts, base_tag, path = 'test.json', strict = False, jobs = None, \
+    chunksize = 256, cache_size = 0):
+    global last
+    last = Throughput('NBT')
+    with multiprocessing.Pool(jobs, init_worker, \
+        (path, strict, cache_size)) as pool:
+        for error in pool.imap(check_text, ((i, base_tag) for i in texts), chunksize):
+            last.add()
+            yield error
+
+def check_files(paths, path = 'test.json', strict = False, jobs = None, limit = None, \
+    cache_size = 0):
+    global last
+    last = Throughput('commands')
+    with multiprocessing.Pool(jobs, init_worker, \
+        (path, strict, cache_size)) as pool:
+        for results in pool.imap(check_file, ((i, limit) for i in paths)):
+            last.add(len(results))
+            for result in results:
+                yield result
@@ -0,0 +1,122 @@
+"""Anvil region (.mca) files.
+
+Iterate the chunks of a region file(yield (x, z, TagCompound)):
+> with region.RegionFile(PATH) as file:
+>     for x, z, chunk in file:
+>         pass
+----------------------------------------------------------
+Entities and block entities of a chunk
+(yield (key, index, base tag, TagCompound)):
+> for key, index, base_tag, tag in region.entities(chunk):
+>     snbt.check_compound_items(schema, tag, base_tag)
+----------------------------------------------------------
+Check a whole region file(yield one result dict per tag):
+> cli.check_region(rules.load('test.json'), PATH)
+
+The file is memory mapped and read in file order, one chunk at a time:
+only the chunk being checked is decompressed and parsed, so memory use
+does not grow with the size of the region or the world."""
+
+import mmap
+import os
+import struct
+import zlib
+import snbt
+
+BASE_TAGS = (
+    ('Entities', '<entity>'),
+    ('TileEntities', '<block>'),
+    ('block_entities', '<block>'),
+)
+
+class RegionFile:
+    sector = 4096
+    locations = struct.Struct('>1024I')
+    chunk_header = struct.Struct('>IB')
+    name = snbt.LazyRegex(r'r\.(-?\d+)\.(-?\d+)\.mca')
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = None
+        self.offsets = (0, ) * 1024
+        if os.fstat(self.file.fileno()).st_size >= 2 * RegionFile.sector:
+            self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+            self.offsets = RegionFile.locations.unpack_from(self.map, 0)
+        match = RegionFile.name.fullmatch(os.path.basename(path))
+        self.x = int(match.group(1)) if match is not None else 0
+        self.z = int(match.group(2)) if match is not None else 0
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *error):
+        self.close()
+    def __len__(self):
+        return len(self.indices())
+    def __iter__(self):
+        for index in self.indices():
+            x, z = self.position(index)
+            yield x, z, self.chunk(index)
+    def indices(self):
+        """Indices of the generated chunks, in the order they are stored."""
+        return sorted((i for i in range(1024) if self.offsets[i] != 0), \
+            key = lambda i: self.offsets[i])
+    def position(self, index):
+        """Chunk coordinates (x, z) of a chunk index."""
+        return self.x * 32 + index % 32, self.z * 32 + index // 32
+    def read(self, index):
+        """Uncompressed binary NBT of a chunk, or None if it is not generated."""
+        if self.offsets[index] == 0:
+            return None
+        start = (self.offsets[index] >> 8) * RegionFile.sector
+        x, z = self.position(index)
+        if start + 5 > len(self.map):
+            raise snbt.NbtException('Chunk %d, %d is out of the file' % (x, z))
+        length, compression = RegionFile.chunk_header.unpack_from(self.map, start)
+        if compression & 128:
+            # stored in c.X.Z.mcc next to the region file
+            try:
+                with open(os.path.join(os.path.dirname(self.path), \
+                    'c.%d.%d.mcc' % (x, z)), 'rb') as file:
+                    data = file.read()
+            except OSError as error:
+                raise snbt.NbtException('Chunk %d, %d: %s' % (x, z, error))
+            compression &= 127
+        else:
+            if length < 1 or start + 4 + length > len(self.map):
+                raise snbt.NbtException('Chunk %d, %d is out of the file' % (x, z))
+            data = self.map[start + 5:start + 4 + length]
+        try:
+            if compression == 1:
+                import gzip
+                return gzip.decompress(data)
+            if compression == 2:
+                return zlib.decompress(data)
+        except (OSError, EOFError, zlib.error) as error:
+            raise snbt.NbtException('Chunk %d, %d: %s' % (x, z, error))
+        if compression == 3:
+            return data
+        raise snbt.NbtException('Unknown compression %d of chunk %d, %d' % \
+            (compression, x, z))
+    def chunk(self, index):
+        """Root compound of a chunk, or None if it is not generated."""
+        data = self.read(index)
+        if data is None:
+            return None
+        return snbt.BinaryReader(data).read_root()[1]
+
+def entities(chunk):
+    """Entities and block entities of a chunk, either under Level (before
+    1.18) or at the root (1.18 chunks and entities/*.mca files)."""
+    level = chunk
+    if 'Level' in chunk and isinstance(chunk['Level'], snbt.TagCompound):
+        level = chunk['Level']
+    for key, base_tag in BASE_TAGS:
+        if key in level and isinstance(level[key], snbt.TagList):
+            index = 0
+            for tag in level[key]:
+                if isinstance(tag, snbt.TagCompound):
+                    yield key, index, base_tag, tag
+                index += 1
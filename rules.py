@@ -0,0 +1,129 @@
+"""Rules file registry.
+
+Load the compiled rules(return snbt.CompiledSchema):
+> rules.load('test.json')
+
+The file is read, parsed and compiled once per process. It is read
+again only when its modification time changes.
+----------------------------------------------------------
+Search the keys of the rules(return snbt text to show):
+> rules.index('test.json').show('fire', '<entity>')
+----------------------------------------------------------
+Cache statistics(return dict):
+> rules.registry.stats()"""
+
+import bisect
+import os
+import snbt
+
+class SearchIndex:
+    """Lowercased keys of every base tag of a rules file, indexed by all
+    their substrings of up to 3 characters. A longer query only compares
+    the keys having all of its 3 character substrings."""
+    def __init__(self, schema):
+        self.rules = schema.rules
+        self.keys = sorted((base_tag, key) for base_tag in self.rules \
+            for key in self.rules[base_tag])
+        self.lowered = [key.lower() for base_tag, key in self.keys]
+        self.grams = {}
+        for number, key in enumerate(self.lowered):
+            for size in range(1, 4):
+                for start in range(len(key) - size + 1):
+                    self.grams.setdefault(key[start:start + size], set()).add(number)
+        self.prefixes = sorted((key, number) for number, key in enumerate(self.lowered))
+        self.rendered = {}
+    def search(self, query, base_tag = None, prefix = False):
+        """(base tag, key) of the keys containing (or starting with) the
+        query, ignoring case, in the order of the base tags and keys."""
+        query = query.lower()
+        if prefix:
+            start = bisect.bisect_left(self.prefixes, (query, ))
+            numbers = []
+            for key, number in self.prefixes[start:]:
+                if not key.startswith(query):
+                    break
+                numbers.append(number)
+        elif len(query) <= 3:
+            numbers = self.grams.get(query, ())
+        else:
+            numbers = None
+            for start in range(len(query) - 2):
+                found = self.grams.get(query[start:start + 3], set())
+                numbers = found if numbers is None else numbers & found
+                if len(numbers) == 0:
+                    break
+            numbers = [i for i in numbers if query in self.lowered[i]]
+        return [self.keys[i] for i in sorted(numbers) \
+            if base_tag is None or self.keys[i][0] == base_tag]
+    def render(self, base_tag, key = None):
+        """JSON of the rule of a key (or of a whole base tag), made once."""
+        if (base_tag, key) not in self.rendered:
+            import json
+            if key is None:
+                text = json.dumps(self.rules[base_tag], sort_keys = True, indent = 4)
+            else:
+                text = '"%s": ' % key + json.dumps(self.rules[base_tag][key], \
+                    sort_keys = True, indent = 4)
+            self.rendered[(base_tag, key)] = text
+        return self.rendered[(base_tag, key)]
+    def show(self, query, base_tag = None):
+        """Text of the Show Tags button: the rules of the keys matching the
+        query in base_tag (or in every base tag if None), or the whole base
+        tag if the query is empty."""
+        query = query.strip()
+        if len(query) == 0:
+            if base_tag is not None:
+                return self.render(base_tag)
+            return '\n\n'.join('%s\n%s' % (base, self.render(base)) \
+                for base in sorted(self.rules))
+        if base_tag is not None and base_tag not in self.rules:
+            raise KeyError(base_tag)
+        found = self.search(query, base_tag)
+        if len(found) == 0:
+            return 'Cannot find the requested NBT'
+        if base_tag is not None:
+            return ',\n'.join(self.render(base_tag, key) for base, key in found)
+        groups = []
+        for base, key in found:
+            if len(groups) == 0 or groups[-1][0] != base:
+                groups.append((base, []))
+            groups[-1][1].append(self.render(base, key))
+        return '\n\n'.join('%s\n%s' % (base, ',\n'.join(texts)) for base, texts in groups)
+
+class Registry:
+    def __init__(self):
+        self.schemas = {}
+        self.indexes = {}
+        self.hits = 0
+        self.misses = 0
+    def load(self, path):
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        if path in self.schemas and self.schemas[path][0] == mtime:
+            self.hits += 1
+            return self.schemas[path][1]
+        self.misses += 1
+        with open(path, 'r') as file:
+            schema = snbt.CompiledSchema(snbt.load_json(file.read()))
+        self.schemas[path] = (mtime, schema)
+        return schema
+    def index(self, path):
+        """SearchIndex of a rules file, made again when the file changes."""
+        schema = self.load(path)
+        path = os.path.abspath(path)
+        if path not in self.indexes or self.indexes[path].rules is not schema.rules:
+            self.indexes[path] = SearchIndex(schema)
+        return self.indexes[path]
+    def clear(self):
+        self.schemas.clear()
+        self.indexes.clear()
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'files': len(self.schemas)}
+
+registry = Registry()
+
+def load(path = 'test.json'):
+    return registry.load(path)
+
+def index(path = 'test.json'):
+    return registry.index(path)
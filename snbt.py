@@ -1,5 +1,3 @@
-import json
-
 """Parse Single Tag(return Tag):
 > Tag.parse(TEXT)
 ----------------------------------------------------------
@@ -32,6 +30,10 @@ Iterate over Items in List Tag:
 >     # do what ever here
 >     pass
 ----------------------------------------------------------
+Numbers of Array Tag([B;...], [I;...], [L;...]) or of List Tag
+of numbers of one type(return array.array):
+> tag.value.array
+----------------------------------------------------------
 Check Type(return Boolean):
 > tag.type_match(type)
 
@@ -48,6 +50,22 @@ String representation of Tag(return string, no indent):
 Pretty print(return string, with indent and line break)
 > tag.tree()
 ----------------------------------------------------------
+Write the text of a big tree to a file, piece by piece:
+> for chunk in iter_encode(tag, indent=None):
+>     file.write(chunk)
+----------------------------------------------------------
+Parse lazily(return Tag, nested compounds and lists are only
+parsed when read with compound['key'] or list[index]):
+> Tag.parse(TEXT, lazy=True)
+----------------------------------------------------------
+Read binary NBT, such as level.dat or a structure file
+(return (name, Tag)):
+> with open(PATH, 'rb') as file:
+>     name, tag = load_binary(file.read())
+----------------------------------------------------------
+Write binary NBT(return bytes, gzip compressed by default):
+> dump_binary(tag, name)
+----------------------------------------------------------
 Error: NbtException
 Sources of error:
 + Illegal black slash outside string, such as 'say \\nhi'
@@ -55,19 +73,101 @@ Sources of error:
 + No ending bracket, such as '{'
 + No ending quote, such as '"abcd'"""
 
-import re
+import array
+import collections
+import struct
+import sys
+import weakref
+import zlib
 
 class NbtException(Exception):
-    def __init__(self, message):
-        self.message = message
+    """Error of parsing or checking NBT.
+
+    Parse errors keep the text and the offset of the error in it, check
+    errors keep the path of keys (str) and list indices (int) to the bad
+    tag. The message is only built when it is read."""
+    def __init__(self, message, path = None, text = None, offset = None, pointer = False, \
+        expected = None):
+        self.reason = message
+        self.expected = expected
+        self.trail = [] if path is None else list(reversed(path))
+        self.text = text
+        self.offset = offset
+        self.pointer = pointer
+        self.rendered = None
+    def add(self, *keys):
+        """Add the keys of the enclosing tag when unwinding a check error."""
+        self.trail.extend(reversed(keys))
+    @property
+    def path(self):
+        return list(reversed(self.trail))
+    @property
+    def message(self):
+        if self.rendered is None:
+            self.rendered = self.render()
+        return self.rendered
+    @message.setter
+    def message(self, message):
+        self.rendered = message
+    def render(self):
+        reason = self.reason
+        if self.expected is not None:
+            reason = reason % self.expected
+        if self.pointer:
+            start = self.offset - 50 if self.offset > 50 else 0
+            return '%s at char %d.\n%s\n%s' % (reason, self.offset + 1, \
+                '...' + self.text[start:self.offset + 1], \
+                ' ' * (self.offset - start + 3) + '^')
+        if self.text is not None:
+            return '%s\n%s' % (reason, self.text[self.offset:])
+        if len(self.trail) == 0:
+            return reason
+        return '%s\nTag stack:\n>    %s' % \
+            (reason, '\n>    '.join(NbtException.stack(self.path)))
+    def stack(path):
+        """Lines of the tag stack of a path, innermost tag first."""
+        temp = []
+        for i in path:
+            if isinstance(i, int) and len(temp) > 0:
+                temp[-1] += '[%d]' % i
+            else:
+                temp.append(str(i))
+        temp.reverse()
+        return temp
+    def __str__(self):
+        return self.message
+
+class LazyRegex:
+    """Regular expression compiled the first time it is used, so that
+    importing snbt neither imports re nor compiles anything."""
+    def __init__(self, source):
+        self.source = source
+    def __getattr__(self, name):
+        import re
+        compiled = re.compile(self.source)
+        # later calls find the methods of the compiled pattern directly
+        for i in ('match', 'fullmatch', 'search', 'finditer', 'findall', 'sub', 'split'):
+            self.__dict__[i] = getattr(compiled, i)
+        return getattr(compiled, name)
 class Tag:
+    __slots__ = ('value', '__weakref__')
     strict = False
-    multiline = re.compile('^', re.M)
     def __init__(self, value = None):
         self.value = value
     def __str__(self):
         return self.value
-    def parse(text):
+    def parse(text, pool = None, lazy = False):
+        try:
+            try:
+                return Parser(text, pool, lazy).parse()
+            except Parser.Fallback:
+                if not lazy:
+                    raise
+            # parse eagerly, so that an error in a skipped compound or list
+            # is raised as it is without lazy
+            return Parser(text, pool).parse()
+        except Parser.Fallback:
+            pass
         success = False
         for i in (TagByte, TagCompound, TagDouble, TagFloat, TagInt, TagList, \
             TagLong, TagShort, TagString):
@@ -95,9 +195,8 @@ class Tag:
             else:
                 if escape:
                     if i == '"':
-                        raise NbtException('Illegal \\" pattern at char %d.\n%s\n%s' % \
-                                (j+1,'...' + text[j-50 if j>50 else 0:j+1],\
-                                ' '*(j-(j-50 if j>50 else 0)+3) + '^'))
+                        raise NbtException('Illegal \\" pattern', text = text, \
+                            offset = j, pointer = True)
                     else:
                         escape = False
                 elif i == ':':
@@ -111,15 +210,13 @@ class Tag:
                     brackets.append(i)
                 elif i == '}':
                     if len(brackets) == 0 or brackets[-1] == '[':
-                        raise NbtException('Imbalance bracket at char %d.\n%s\n%s' % \
-                            (j+1,'...' + text[j-50 if j>50 else 0:j+1],\
-                            ' '*(j-(j-50 if j>50 else 0)+3) + '^'))
+                        raise NbtException('Imbalance bracket', text = text, \
+                            offset = j, pointer = True)
                     brackets.pop()
                 elif i == ']':
                     if len(brackets) == 0 or brackets[-1] == '{':
-                        raise NbtException('Imbalance bracket at char %d.\n%s\n%s' % \
-                            (j+1,'...' + text[j-50 if j>50 else 0:j+1],\
-                            ' '*(j-(j-50 if j>50 else 0)+3) + '^'))
+                        raise NbtException('Imbalance bracket', text = text, \
+                            offset = j, pointer = True)
                     brackets.pop()
                 elif i == '"':
                     string = True
@@ -131,9 +228,9 @@ class Tag:
                         return key.strip(), value.strip(), j+1
                 temp.append(i)
         if len(brackets) > 0:
-            raise NbtException('No ending bracket.\n%s' % text[index:])
+            raise NbtException('No ending bracket.', text = text, offset = index)
         if string:
-            raise NbtException('No ending quote\n%s' % text[index:])
+            raise NbtException('No ending quote', text = text, offset = index)
         value = ''.join(temp)
         return key.strip(), value.strip(), len(text)
     def tree(self):
@@ -155,12 +252,54 @@ class Tag:
             return TagShort
         elif text == 'string':
             return TagString
+        elif text == 'byte array':
+            return TagByteArray
         elif text == 'int array':
             return TagIntArray
+        elif text == 'long array':
+            return TagLongArray
         else:
             return TagCompound
+class TagArray(Tag):
+    """Base of TagByteArray, TagIntArray and TagLongArray ([B;...], [I;...]
+    and [L;...]), keeping the numbers in a PackedList."""
+    __slots__ = ()
+    def __init__(self, value = ()):
+        if not isinstance(value, PackedList):
+            value = PackedList(self.kind, array.array(self.typecode, value))
+        self.value = value
+    def __contains__(self, item):
+        return item in self.value
+    def __getitem__(self, key):
+        return self.value[key]
+    def __setitem__(self, key, value):
+        self.value[key] = value
+    def __delitem__(self, key):
+        del(self.value[key])
+    def __len__(self):
+        return len(self.value)
+    def __iter__(self):
+        return iter(self.value)
+    def __str__(self):
+        return '[%s;%s]' % (self.prefix, ','.join(self.value.strings()))
+    def append(kind, values, tag, text, offset):
+        """Append the number of an item to the array.array of an array of
+        class kind, raising NbtException at text[offset] if it does not fit."""
+        if type(tag) not in (TagByte, TagShort, TagInt, TagLong):
+            raise NbtException('Invalid item of %s', text = text, offset = offset, \
+                pointer = True, expected = kind.name)
+        try:
+            values.append(tag.value)
+        except OverflowError:
+            raise NbtException('Item out of range of %s', text = text, offset = offset, \
+                pointer = True, expected = kind.name)
+    def type_match(self, nbt_type):
+        if Tag.strict:
+            return nbt_type is type(self)
+        return nbt_type is type(self) or nbt_type is TagList
 class TagByte(Tag):
-    pattern = re.compile(r'(-?\d+)b|(true|false)')
+    __slots__ = ()
+    pattern = LazyRegex(r'(-?\d+)b|(true|false)')
     def __str__(self):
         return str(self.value) + "b"
     def parse(text):
@@ -179,22 +318,34 @@ class TagByte(Tag):
         if Tag.strict:
             return nbt_type is TagByte
         return nbt_type in [TagByte]
+class TagByteArray(TagArray):
+    __slots__ = ()
+    name = 'byte array'
+    prefix = 'B'
+    typecode = 'b'
 class TagCompound(Tag):
+    __slots__ = ()
     def __contains__(self, item):
         return item in self.value
     def __getitem__(self, key):
-        return self.value[key]
+        tag = self.value[key]
+        if type(tag) is Span:
+            tag = self.value[key] = tag.load()
+        return tag
     def __setitem__(self, key, value):
         self.value[key] = value
     def __delitem__(self, key):
         del(self.value[key])
     def __init__(self, value = {}):
         self.value = value
-    def __str__(self):
-        temp = []
+    def load(self):
+        """Parse the children still kept as text by a lazy parse."""
         for key, tag in self.value.items():
-            temp.append(key + ":" + str(tag))
-        return '{%s}' % ','.join(temp)
+            if type(tag) is Span:
+                self.value[key] = tag.load()
+        return self
+    def __str__(self):
+        return Writer().text(self)
     def keys(self):
         return self.value.keys()
     def parse(text):
@@ -207,19 +358,14 @@ class TagCompound(Tag):
             return True, TagCompound(tags)
         return False, None
     def tree(self):
-        temp = []
-        for key in self.value:
-            temp.append(Tag.multiline.sub(' ' * 4, key + ":" + self.value[key].tree()))
-        if len(temp) > 0:
-            return '{\n%s\n}' % ',\n'.join(temp)
-        else:
-            return '{}'
+        return Writer(4).text(self)
     def type_match(self, nbt_type):
         if Tag.strict:
             return nbt_type is TagCompound
         return nbt_type in [TagCompound]
 class TagDouble(Tag):
-    pattern = re.compile(r'(-?\d+\.\d+[dD]?)|(-?\d+[dD])')
+    __slots__ = ()
+    pattern = LazyRegex(r'(-?\d+\.\d+[dD]?)|(-?\d+[dD])')
     def __str__(self):
         return str(self.value) + "d"
     def parse(text):
@@ -233,7 +379,8 @@ class TagDouble(Tag):
             return nbt_type is TagDouble
         return nbt_type in [TagDouble]
 class TagFloat(Tag):
-    pattern = re.compile(r'(-?\d+(\.\d+)?)[fF]')
+    __slots__ = ()
+    pattern = LazyRegex(r'(-?\d+(\.\d+)?)[fF]')
     def __str__(self):
         return str(self.value) + "f"
     def parse(text):
@@ -246,7 +393,8 @@ class TagFloat(Tag):
             return nbt_type is TagFloat
         return nbt_type in [TagFloat]
 class TagInt(Tag):
-    pattern = re.compile(r'-?\d+')
+    __slots__ = ()
+    pattern = LazyRegex(r'-?\d+')
     def __str__(self):
         return str(self.value)
     def parse(text):
@@ -258,14 +406,27 @@ class TagInt(Tag):
         if Tag.strict:
             return nbt_type is TagInt
         return nbt_type in [TagInt, TagByte, TagShort]
-class TagIntArray(Tag):
-    pass
+class TagIntArray(TagArray):
+    __slots__ = ()
+    name = 'int array'
+    prefix = 'I'
+    typecode = 'i'
 class TagList(Tag):
+    __slots__ = ()
     def __contains__(self, item):
         return item in self.value
     def __getitem__(self, key):
-        return self.value[key]
+        tag = self.value[key]
+        if type(tag) is Span:
+            tag = self.value[key] = tag.load()
+        return tag
     def __setitem__(self, key, value):
+        if isinstance(self.value, PackedList):
+            try:
+                self.value[key] = value
+                return
+            except (TypeError, OverflowError):
+                self.value = list(self.value)
         self.value[key] = value
     def __delitem__(self, key):
         del(self.value[key])
@@ -273,12 +434,29 @@ class TagList(Tag):
         return len(self.value)
     def __init__(self, value = []):
         self.value = value
+    def __iter__(self):
+        if isinstance(self.value, PackedList):
+            return iter(self.value)
+        return iter(self.load().value)
+    def load(self):
+        """Parse the children still kept as text by a lazy parse."""
+        if not isinstance(self.value, PackedList):
+            for index, tag in enumerate(self.value):
+                if type(tag) is Span:
+                    self.value[index] = tag.load()
+        return self
     def __str__(self):
-        temp = []
-        for tag in self.value:
-            temp.append(str(tag))
-        return '[%s]' % ','.join(temp)
+        return Writer().text(self)
     def parse(text):
+        if text[:1] == '[' and text[2:3] == ';' and text[1] in Parser.arrays and \
+            text[-1] == ']':
+            kind = Parser.arrays[text[1]]
+            values = array.array(kind.typecode)
+            index = 0
+            while index < len(text[3:-1]):
+                key, value, index = Tag.parse_key_value(text[3:-1], index)
+                TagArray.append(kind, values, Tag.parse(value), text, index + 2)
+            return True, kind(PackedList(kind.kind, values))
         if text[0] == '[' and text[-1] == ']':
             index = 0
             tags = []
@@ -288,19 +466,14 @@ class TagList(Tag):
             return True, TagList(tags)
         return False, None
     def tree(self):
-        temp = []
-        for tag in self.value:
-            temp.append(Tag.multiline.sub(' ' * 4, tag.tree()))
-        if len(temp) > 0:
-            return '[\n%s\n]' % ',\n'.join(temp)
-        else:
-            return '[]'
+        return Writer(4).text(self)
     def type_match(self, nbt_type):
         if Tag.strict:
-            return nbt_type in [TagList, TagIntArray]
-        return nbt_type in [TagList, TagIntArray]
+            return nbt_type in [TagList, TagByteArray, TagIntArray, TagLongArray]
+        return nbt_type in [TagList, TagByteArray, TagIntArray, TagLongArray]
 class TagLong(Tag):
-    pattern = re.compile(r'(-?\d+)[lL]')
+    __slots__ = ()
+    pattern = LazyRegex(r'(-?\d+)[lL]')
     def __str__(self):
         return str(self.value) + "l"
     def parse(text):
@@ -312,8 +485,14 @@ class TagLong(Tag):
         if Tag.strict:
             return nbt_type is TagLong
         return nbt_type in [TagLong]
+class TagLongArray(TagArray):
+    __slots__ = ()
+    name = 'long array'
+    prefix = 'L'
+    typecode = 'q'
 class TagShort(Tag):
-    pattern = re.compile(r'(-?\d+)[sS]')
+    __slots__ = ()
+    pattern = LazyRegex(r'(-?\d+)[sS]')
     def __str__(self):
         return str(self.value) + "s"
     def parse(text):
@@ -326,9 +505,13 @@ class TagShort(Tag):
             return nbt_type is TagShort
         return nbt_type in [TagShort]
 class TagString(Tag):
+    __slots__ = ()
+    number = LazyRegex(r'\d+(\.\d+)?[bBdDfFlLsS]?')
+    # need_escape is False for text without any of these
+    special = LazyRegex(r'[{}\[\]",\\]')
     def __str__(self):
-        if TagString.need_escape(self.value) or \
-            re.fullmatch(r'\d+(\.\d+)?[bBdDfFlLsS]?', self.value) is not None or \
+        if len(self.value) == 0 or TagString.need_escape(self.value) or \
+            TagString.number.fullmatch(self.value) is not None or \
             (self.value[0] in ['{', '['] and self.value[-1] in ['}', ']']):
             return '"' + TagString.escape(self.value) + '"'
         else:
@@ -336,6 +519,8 @@ class TagString(Tag):
     def escape(text):
         return text.replace('\\', '\\\\').replace('"', '\\"')
     def need_escape(text):
+        if TagString.special.search(text) is None:
+            return False
         brackets = []
         in_string = False
         for char in text:
@@ -379,83 +564,976 @@ class TagString(Tag):
     def type_match(self, nbt_type):
         return nbt_type is TagString
 
+class PackedList:
+    """Numeric tags of one class stored unboxed in an array.array.
+
+    Used as the value of TagArray tags and of TagList tags parsed from
+    lists of numbers of one type. Items are made on access, so they are
+    copies: change an item with packed[index] = tag, not by setting the
+    value of the item."""
+    def __init__(self, kind, values):
+        self.kind = kind
+        self.array = values
+    def pack(tags):
+        """PackedList of the tags, or None if they are not numbers of one
+        class fitting in an array."""
+        kind = type(tags[0])
+        if kind not in PackedList.typecodes:
+            return None
+        for tag in tags:
+            if type(tag) is not kind:
+                return None
+        try:
+            return PackedList(kind, \
+                array.array(PackedList.typecodes[kind], [tag.value for tag in tags]))
+        except OverflowError:
+            return None
+    def __len__(self):
+        return len(self.array)
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PackedList(self.kind, self.array[index])
+        return self.kind(self.array[index])
+    def __setitem__(self, index, tag):
+        if type(tag) is not self.kind:
+            raise TypeError('Not %s' % self.kind.__name__)
+        self.array[index] = tag.value
+    def __delitem__(self, index):
+        del(self.array[index])
+    def __iter__(self):
+        return map(self.kind, self.array)
+    def append(self, tag):
+        if type(tag) is not self.kind:
+            raise TypeError('Not %s' % self.kind.__name__)
+        self.array.append(tag.value)
+    def strings(self):
+        """str() of every item, without making the items."""
+        suffix = PackedList.suffixes[self.kind]
+        return [str(i) + suffix for i in self.array]
+    def batches(self, separator, size = 1024):
+        """Yield the str() of the items joined by separator, size items at
+        a time, so that a big array is never written in one piece."""
+        suffix = PackedList.suffixes[self.kind]
+        for start in range(0, len(self.array), size):
+            yield separator.join([str(i) + suffix for i in self.array[start:start + size]])
+
+class Span:
+    """Source text of a compound or list not parsed yet by a lazy parse. It
+    is parsed by TagCompound.__getitem__ and TagList.__getitem__ (or when
+    the parent is printed), so errors in it are only raised then."""
+    __slots__ = ('text', 'start', 'end', 'pool')
+    def __init__(self, text, start, end, pool):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.pool = pool
+    def load(self, lazy = True):
+        parser = Parser(self.text, self.pool, lazy)
+        parser.index = self.start
+        try:
+            tag = parser.parse_container()
+            if parser.index == self.end:
+                return tag
+        except Parser.Fallback:
+            pass
+        return Tag.parse(self.text[self.start:self.end], self.pool)
+
+class Writer:
+    """Writes a tree as SNBT text in one pass over it, for str() (indent
+    None) and tree() (indent 4). Every line of a tag at depth n is indented
+    by indent * n spaces as it is written, and the text is built in pieces
+    of about Writer.size strings, so chunks() can send it somewhere
+    without keeping all of it in memory."""
+    size = 4096
+    def __init__(self, indent = None):
+        self.indent = indent
+    def text(self, tag):
+        return ''.join(self.chunks(tag))
+    def chunks(self, tag):
+        """Yield the text of the tag in pieces."""
+        parts = []
+        # [items, depth, separator, next separator, closer, compound]
+        stack = []
+        self.start(tag, 0, parts, stack)
+        while len(stack) > 0:
+            frame = stack[-1]
+            item = next(frame[0], None)
+            if item is None:
+                stack.pop()
+                parts.append(frame[4])
+                continue
+            parts.append(frame[2])
+            frame[2] = frame[3]
+            if frame[5]:
+                key, item = item
+                if self.indent is not None and '\n' in key:
+                    key = key.replace('\n', '\n' + ' ' * self.indent * (frame[1] + 1))
+                parts.append(key)
+                parts.append(':')
+            kind = type(item)
+            if kind is str:
+                # a batch of numbers, sent on at once
+                parts.append(item)
+                yield ''.join(parts)
+                parts.clear()
+            elif kind is TagCompound or kind is TagList or self.indent is not None or \
+                isinstance(item, TagArray):
+                self.start(item, frame[1] + 1, parts, stack)
+            else:
+                parts.append(str(item))
+            if len(parts) >= Writer.size:
+                yield ''.join(parts)
+                parts.clear()
+        yield ''.join(parts)
+    def start(self, tag, depth, parts, stack):
+        """Write a scalar, or the opening bracket of a compound or list and
+        push its items on the stack."""
+        kind = type(tag)
+        if kind is TagCompound:
+            items = tag.load().value
+            opener = '{'
+            closer = '}'
+            compound = True
+        elif kind is TagList:
+            compound = False
+            opener = '['
+            closer = ']'
+            items = tag.load().value
+        elif isinstance(tag, TagArray):
+            # on one line in tree() as well
+            parts.append('[%s;' % tag.prefix)
+            stack.append([tag.value.batches(','), depth, '', ',', ']', False])
+            return
+        else:
+            text = str(tag)
+            if self.indent is not None and depth > 0 and '\n' in text:
+                text = text.replace('\n', '\n' + ' ' * self.indent * depth)
+            parts.append(text)
+            return
+        if self.indent is None:
+            parts.append(opener)
+            stack.append([Writer.items(items, compound, ','), depth, '', ',', closer, \
+                compound])
+        elif len(items) == 0:
+            parts.append(opener + closer)
+        else:
+            pad = '\n' + ' ' * self.indent * (depth + 1)
+            parts.append(opener)
+            stack.append([Writer.items(items, compound, ',' + pad), depth, pad, \
+                ',' + pad, '\n' + ' ' * self.indent * depth + closer, compound])
+    def items(items, compound, separator):
+        """Iterator of the items of a frame, numbers of a PackedList coming
+        in batches already joined by separator."""
+        if compound:
+            return iter(items.items())
+        if isinstance(items, PackedList):
+            return items.batches(separator)
+        return iter(items)
+
+def iter_encode(tag, indent = None):
+    """Yield the SNBT text of a tag in pieces: str(tag) with indent None,
+    else a tree() with indent spaces per level."""
+    return Writer(indent).chunks(tag)
+
+class Pool:
+    """Weak value pool sharing equal tags between parsed trees.
+
+    Scalar tags are keyed on their source text, so the 100000th
+    id:"minecraft:stone" of a structure is the same TagString object as
+    the first one. With compounds = True, compounds with the same source
+    text are shared as well, and sources maps each of them to its text.
+    Shared tags must not be modified.
+
+    Parse with a pool:
+    > pool = Pool()
+    > tag = Tag.parse(TEXT, pool)"""
+    def __init__(self, compounds = False):
+        self.tags = weakref.WeakValueDictionary()
+        self.compounds = compounds
+        self.sources = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+    def __len__(self):
+        return len(self.tags)
+    def get(self, text, make):
+        tag = self.tags.get(text)
+        if tag is None:
+            self.misses += 1
+            tag = make(text)
+            self.tags[text] = tag
+        else:
+            self.hits += 1
+        return tag
+    def share(self, text, tag):
+        shared = self.tags.get(text)
+        if shared is None:
+            self.misses += 1
+            self.tags[text] = tag
+            self.sources[tag] = text
+            return tag
+        self.hits += 1
+        return shared
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.tags)}
+
+class Parser:
+    """Recursive descent parser walking the text once with an index cursor.
+
+    Only well formed text is handled here. Whenever the input is something
+    the bracket scanner of Tag.parse_key_value treats specially (imbalance
+    brackets, empty values, text after a closing bracket...), Parser.Fallback
+    is raised and Tag.parse uses the old code path, so the tree and the
+    NbtException messages are the same as before."""
+    class Fallback(Exception):
+        pass
+    plain = LazyRegex(r'[^,:{}\[\]"\\]*')
+    string = LazyRegex(r'[^"\\]*')
+    space = LazyRegex(r'\s*')
+    closers = {'{': '}', '[': ']'}
+    number = LazyRegex(r'(-?\d+(\.\d+)?)([bBdDfFlLsS]?)')
+    booleans = {'true': 1, 'false': 0}
+    def __init__(self, text, pool = None, lazy = False):
+        self.text = text
+        self.index = 0
+        self.pool = pool
+        self.lazy = lazy
+        # (start, end, tag) of every nested container when set to a list
+        self.spans = None
+    def parse(self):
+        text = self.text
+        if len(text) > 0 and text[0] in Parser.closers and \
+            text[-1] == Parser.closers[text[0]]:
+            tag = self.parse_container()
+            if self.index != len(text):
+                raise Parser.Fallback()
+            return tag
+        return self.scalar(text)
+    def scalar(self, text):
+        if self.pool is None:
+            return Parser.parse_scalar(text)
+        return self.pool.get(text, Parser.parse_scalar)
+    def parse_scalar(text):
+        """Decide the type of a non container value from its first and last
+        characters and one number pattern, instead of trying the pattern of
+        every Tag class in turn."""
+        if len(text) == 0:
+            raise Parser.Fallback()
+        first = text[0]
+        if first == '"':
+            return TagString.parse(text)[1]
+        if first in 'tTfF':
+            if len(text) < 6 and text.lower() in Parser.booleans:
+                return TagByte(Parser.booleans[text.lower()])
+            return TagString.parse(text)[1]
+        match = Parser.number.fullmatch(text)
+        if match is None:
+            return TagString.parse(text)[1]
+        number, fraction, suffix = match.groups()
+        if fraction is None:
+            if suffix in Parser.integers:
+                return Parser.integers[suffix](int(number))
+        elif suffix != '' and suffix in 'bBsSlL':
+            return TagString.parse(text)[1]
+        if suffix == 'f' or suffix == 'F':
+            return TagFloat(float(number))
+        return TagDouble(float(number))
+    def parse_container(self):
+        start = self.index
+        opener = self.text[self.index]
+        if opener == '[' and self.text.startswith(';', self.index + 2) and \
+            self.text[self.index + 1] in Parser.arrays:
+            return self.parse_array()
+        closer = Parser.closers[opener]
+        self.index += 1
+        if opener == '{':
+            tags = {}
+        else:
+            tags = []
+        if self.index < len(self.text) and self.text[self.index] == closer:
+            self.index += 1
+        else:
+            while True:
+                key, tag, stop = self.parse_entry(closer)
+                if opener == '{':
+                    if self.lazy and type(tags.get(key)) is Span:
+                        # parsed anyway by an eager parse, and may raise
+                        tags[key].load(False)
+                    tags[key] = tag
+                else:
+                    tags.append(tag)
+                self.index += 1
+                if stop == closer:
+                    break
+                # a trailing comma is allowed right before the closing bracket
+                if self.index < len(self.text) and self.text[self.index] == closer:
+                    self.index += 1
+                    break
+        if opener == '{':
+            if self.pool is not None and self.pool.compounds:
+                return self.pool.share(self.text[start:self.index], TagCompound(tags))
+            return TagCompound(tags)
+        if len(tags) > 1:
+            packed = PackedList.pack(tags)
+            if packed is not None:
+                return TagList(packed)
+        return TagList(tags)
+    def parse_array(self):
+        kind = Parser.arrays[self.text[self.index + 1]]
+        values = array.array(kind.typecode)
+        self.index += 3
+        if self.index < len(self.text) and self.text[self.index] == ']':
+            self.index += 1
+            return kind(PackedList(kind.kind, values))
+        while True:
+            key, tag, stop = self.parse_entry(']')
+            if key != '':
+                raise Parser.Fallback()
+            TagArray.append(kind, values, tag, self.text, self.index - 1)
+            self.index += 1
+            if stop == ']':
+                break
+            if self.index < len(self.text) and self.text[self.index] == ']':
+                self.index += 1
+                break
+        return kind(PackedList(kind.kind, values))
+    def parse_entry(self, closer):
+        text = self.text
+        start = self.index
+        self.skip_space()
+        key = ''
+        if text[self.index] not in Parser.closers:
+            stop = self.scan(closer, True)
+            if stop != ':':
+                return key, self.scalar(text[start:self.index].strip()), stop
+            key = text[start:self.index].strip()
+            self.index += 1
+            start = self.index
+            self.skip_space()
+            if text[self.index] not in Parser.closers:
+                stop = self.scan(closer, False)
+                return key, self.scalar(text[start:self.index].strip()), stop
+        if self.lazy:
+            start = self.index
+            self.skip_container()
+            tag = Span(text, start, self.index, self.pool)
+        else:
+            start = self.index
+            tag = self.parse_container()
+            if self.spans is not None:
+                self.spans.append((start, self.index, tag))
+        self.skip_space()
+        stop = text[self.index]
+        if stop != ',' and stop != closer:
+            raise Parser.Fallback()
+        return key, tag, stop
+    def skip_space(self):
+        self.index = Parser.space.match(self.text, self.index).end()
+        if self.index >= len(self.text):
+            raise Parser.Fallback()
+    def skip_container(self):
+        """Move the cursor past the compound or list at the cursor without
+        parsing it."""
+        text = self.text
+        brackets = []
+        while True:
+            self.index = Parser.plain.match(text, self.index).end()
+            if self.index >= len(text):
+                raise Parser.Fallback()
+            char = text[self.index]
+            if char == '"':
+                self.index += 1
+                self.skip_string()
+                continue
+            elif char == '\\':
+                if self.index + 1 >= len(text) or text[self.index + 1] == '"':
+                    raise Parser.Fallback()
+                self.index += 1
+            elif char == '{' or char == '[':
+                brackets.append(Parser.closers[char])
+            elif char == '}' or char == ']':
+                if brackets.pop() != char:
+                    raise Parser.Fallback()
+                if len(brackets) == 0:
+                    self.index += 1
+                    return
+            self.index += 1
+    def skip_string(self):
+        text = self.text
+        while True:
+            self.index = Parser.string.match(text, self.index).end()
+            if self.index >= len(text):
+                raise Parser.Fallback()
+            if text[self.index] == '"':
+                self.index += 1
+                return
+            self.index += 2
+    def scan(self, closer, has_key):
+        """Move the cursor to the ',', ':' or closing bracket ending a value,
+        skipping strings and nested brackets, and return that character."""
+        text = self.text
+        brackets = []
+        while True:
+            self.index = Parser.plain.match(text, self.index).end()
+            if self.index >= len(text):
+                raise Parser.Fallback()
+            char = text[self.index]
+            if char == '"':
+                self.index += 1
+                self.skip_string()
+                continue
+            elif char == '\\':
+                if self.index + 1 >= len(text) or text[self.index + 1] == '"':
+                    raise Parser.Fallback()
+                self.index += 1
+            elif char == ':':
+                if has_key:
+                    return char
+            elif char == '{' or char == '[':
+                has_key = False
+                brackets.append(Parser.closers[char])
+            elif char == '}' or char == ']':
+                if len(brackets) == 0:
+                    if char != closer:
+                        raise Parser.Fallback()
+                    return char
+                if brackets.pop() != char:
+                    raise Parser.Fallback()
+            elif len(brackets) == 0:
+                return char
+            self.index += 1
+
+class BinaryReader:
+    """Reader of binary NBT (big-endian, as in level.dat, structure .nbt and
+    player .dat files) into Tag objects. Arrays and lists of numbers are
+    read with one array.array per tag into a PackedList."""
+    byte = struct.Struct('>b')
+    ubyte = struct.Struct('>B')
+    short = struct.Struct('>h')
+    ushort = struct.Struct('>H')
+    int = struct.Struct('>i')
+    long = struct.Struct('>q')
+    float = struct.Struct('>f')
+    double = struct.Struct('>d')
+    def __init__(self, data):
+        self.data = data
+        self.index = 0
+    def unpack(self, format):
+        value = format.unpack_from(self.data, self.index)[0]
+        self.index += format.size
+        return value
+    def read_root(self):
+        """Read the named root tag, return (name, tag)."""
+        try:
+            tag_id = self.unpack(BinaryReader.ubyte)
+            if tag_id == 0:
+                raise NbtException('No root tag in binary NBT')
+            name = self.read_string()
+            return name, self.read_payload(tag_id)
+        except struct.error:
+            raise NbtException('Unexpected end of binary NBT at byte %d' % self.index)
+        except UnicodeDecodeError:
+            raise NbtException('Invalid string in binary NBT before byte %d' % self.index)
+    def read_string(self):
+        length = self.unpack(BinaryReader.ushort)
+        start = self.index
+        self.index += length
+        if self.index > len(self.data):
+            raise struct.error('string out of data')
+        return BinaryReader.decode(bytes(self.data[start:self.index]))
+    def decode(data):
+        """Text of Java's Modified UTF-8: NUL is C0 80, and characters out of
+        the BMP are two 3 byte surrogates (CESU-8)."""
+        if b'\xc0' not in data and b'\xed' not in data:
+            return data.decode('utf-8')
+        text = data.replace(b'\xc0\x80', b'\0').decode('utf-8', 'surrogatepass')
+        # join the surrogate pairs
+        return text.encode('utf-16-be', 'surrogatepass').decode('utf-16-be', 'surrogatepass')
+    def read_array(self, typecode, count):
+        values = array.array(typecode)
+        size = values.itemsize * count
+        if count < 0 or self.index + size > len(self.data):
+            raise struct.error('array out of data')
+        values.frombytes(self.data[self.index:self.index + size])
+        self.index += size
+        if values.itemsize > 1 and sys.byteorder == 'little':
+            values.byteswap()
+        return values
+    def read_payload(self, tag_id):
+        if tag_id in BinaryReader.scalars:
+            kind, format = BinaryReader.scalars[tag_id]
+            return kind(self.unpack(format))
+        if tag_id == 8:
+            return TagString(self.read_string())
+        if tag_id == 10:
+            tags = {}
+            while True:
+                item_id = self.unpack(BinaryReader.ubyte)
+                if item_id == 0:
+                    return TagCompound(tags)
+                key = self.read_string()
+                tags[key] = self.read_payload(item_id)
+        if tag_id == 9:
+            item_id = self.unpack(BinaryReader.ubyte)
+            count = self.unpack(BinaryReader.int)
+            if item_id in BinaryReader.scalars and count > 1:
+                kind = BinaryReader.scalars[item_id][0]
+                values = self.read_array(BinaryWriter.typecodes[kind], count)
+                if values.typecode != PackedList.typecodes[kind]:
+                    values = array.array(PackedList.typecodes[kind], values)
+                return TagList(PackedList(kind, values))
+            return TagList([self.read_payload(item_id) for i in range(count)])
+        if tag_id in BinaryReader.arrays:
+            kind = BinaryReader.arrays[tag_id]
+            values = self.read_array(kind.typecode, self.unpack(BinaryReader.int))
+            return kind(PackedList(kind.kind, values))
+        raise NbtException('Unknown tag type %d at byte %d' % (tag_id, self.index - 1))
+
+class BinaryWriter:
+    """Writer of Tag objects as binary NBT. Lists must hold tags of one
+    class, and numbers must fit the size of their tag type."""
+    def __init__(self):
+        self.parts = []
+    def write_root(self, name, tag):
+        try:
+            self.parts.append(BinaryReader.ubyte.pack(BinaryWriter.ids[type(tag)]))
+            self.write_string(name)
+            self.write_payload(tag)
+        except (struct.error, OverflowError) as error:
+            raise NbtException('Cannot write binary NBT: %s' % error)
+        return b''.join(self.parts)
+    def write_string(self, text):
+        data = BinaryWriter.encode(text)
+        self.parts.append(BinaryReader.ushort.pack(len(data)))
+        self.parts.append(data)
+    def encode(text):
+        """Java's Modified UTF-8 of a text, see BinaryReader.decode."""
+        if text.isascii() or max(text) < '\U00010000':
+            data = text.encode('utf-8', 'surrogatepass')
+        else:
+            # split the characters out of the BMP into surrogate pairs
+            temp = []
+            for char in text:
+                if char < '\U00010000':
+                    temp.append(char)
+                else:
+                    code = ord(char) - 0x10000
+                    temp.append(chr(0xd800 + (code >> 10)) + chr(0xdc00 + (code & 0x3ff)))
+            data = ''.join(temp).encode('utf-8', 'surrogatepass')
+        return data.replace(b'\0', b'\xc0\x80')
+    def write_array(self, typecode, values):
+        values = array.array(typecode, values)
+        if values.itemsize > 1 and sys.byteorder == 'little':
+            values.byteswap()
+        self.parts.append(values.tobytes())
+    def write_payload(self, tag):
+        kind = type(tag)
+        if kind in BinaryWriter.formats:
+            self.parts.append(BinaryWriter.formats[kind].pack(tag.value))
+        elif kind is TagString:
+            self.write_string(tag.value)
+        elif kind is TagCompound:
+            for key, item in tag.load().value.items():
+                self.parts.append(BinaryReader.ubyte.pack(BinaryWriter.ids[type(item)]))
+                self.write_string(key)
+                self.write_payload(item)
+            self.parts.append(b'\0')
+        elif kind is TagList:
+            items = tag.load().value
+            if isinstance(items, PackedList):
+                self.parts.append(BinaryReader.ubyte.pack(BinaryWriter.ids[items.kind]))
+                self.parts.append(BinaryReader.int.pack(len(items)))
+                self.write_array(BinaryWriter.typecodes[items.kind], items.array)
+                return
+            item_id = 0
+            if len(items) > 0:
+                item_id = BinaryWriter.ids[type(items[0])]
+                for item in items:
+                    if type(item) is not type(items[0]):
+                        raise NbtException('Cannot write binary NBT: list of %s and %s' % \
+                            (type(items[0]).__name__, type(item).__name__))
+            self.parts.append(BinaryReader.ubyte.pack(item_id))
+            self.parts.append(BinaryReader.int.pack(len(items)))
+            for item in items:
+                self.write_payload(item)
+        else:
+            self.parts.append(BinaryReader.int.pack(len(tag.value)))
+            self.write_array(kind.typecode, tag.value.array)
+
+TagByteArray.kind = TagByte
+TagIntArray.kind = TagInt
+TagLongArray.kind = TagLong
+# float is kept as double so the numbers (and str()) do not change
+PackedList.typecodes = {TagByte: 'b', TagShort: 'h', TagInt: 'q', TagLong: 'q', \
+    TagFloat: 'd', TagDouble: 'd'}
+PackedList.suffixes = {TagByte: 'b', TagShort: 's', TagInt: '', TagLong: 'l', \
+    TagFloat: 'f', TagDouble: 'd'}
+Parser.arrays = {'B': TagByteArray, 'I': TagIntArray, 'L': TagLongArray}
+BinaryReader.scalars = {1: (TagByte, BinaryReader.byte), 2: (TagShort, BinaryReader.short), \
+    3: (TagInt, BinaryReader.int), 4: (TagLong, BinaryReader.long), \
+    5: (TagFloat, BinaryReader.float), 6: (TagDouble, BinaryReader.double)}
+BinaryReader.arrays = {7: TagByteArray, 11: TagIntArray, 12: TagLongArray}
+BinaryWriter.ids = {TagByte: 1, TagShort: 2, TagInt: 3, TagLong: 4, TagFloat: 5, \
+    TagDouble: 6, TagByteArray: 7, TagString: 8, TagList: 9, TagCompound: 10, \
+    TagIntArray: 11, TagLongArray: 12}
+BinaryWriter.formats = {kind: format for kind, format in BinaryReader.scalars.values()}
+BinaryWriter.typecodes = {TagByte: 'b', TagShort: 'h', TagInt: 'i', TagLong: 'q', \
+    TagFloat: 'f', TagDouble: 'd'}
+Parser.integers = {'': TagInt, 'b': TagByte, 'B': TagByte, 's': TagShort, \
+    'S': TagShort, 'l': TagLong, 'L': TagLong}
+
 def load_json(json_text):
+    import json
     return json.loads(json_text)
 
-def check_compound_items(rules, compound, base_tag):
-    for key in compound.keys():
-        if key not in rules[base_tag]:
-            raise NbtException('Unknown tag name\nTag stack:\n>    %s' % key)
+def load_binary(data):
+    """Read binary NBT (gzip, zlib or uncompressed bytes), return the name
+    and the Tag of the root."""
+    try:
+        if data[:2] == b'\x1f\x8b':
+            import gzip
+            data = gzip.decompress(data)
+        elif data[:1] == b'\x78':
+            data = zlib.decompress(data)
+    except (OSError, EOFError, zlib.error) as error:
+        raise NbtException('Cannot decompress binary NBT: %s' % error)
+    return BinaryReader(data).read_root()
+
+def dump_binary(tag, name = '', compression = 'gzip'):
+    """Write a tag as binary NBT compressed with 'gzip', 'zlib' or None."""
+    data = BinaryWriter().write_root(name, tag)
+    if compression == 'gzip':
+        import gzip
+        return gzip.compress(data)
+    if compression == 'zlib':
+        return zlib.compress(data)
+    return data
+
+class Diagnostic:
+    """One problem found by collect_compound_errors.
+
+    path is the list of keys (str) and list indices (int) leading to the
+    tag, expected describes what the rule wants, actual is the tag (None
+    if it is missing) and rule is the rule dict of the key."""
+    def __init__(self, message, path, expected = None, actual = None, rule = None):
+        self.message = message
+        self.path = path
+        self.expected = expected
+        self.actual = actual
+        self.rule = rule
+    def __str__(self):
+        return '%s\nTag stack:\n>    %s' % \
+            (self.message, '\n>    '.join(NbtException.stack(self.path)))
+    def to_dict(self):
+        return {'message': self.message, 'path': self.path, 'expected': self.expected, \
+            'actual': None if self.actual is None else str(self.actual), 'rule': self.rule}
+
+class ValidationCache:
+    """Bounded LRU cache of check results, keyed on the source text of the
+    compound, the base tag and Tag.strict. It is emptied when used with
+    another CompiledSchema.
+
+    Only compounds parsed with the pool of the cache have their source
+    text at hand, so parse the trees to check with it. Other compounds
+    are checked without the cache. The result of a compound is that of
+    its source text: compounds parsed with the pool must not be modified.
+    > tag = Tag.parse(TEXT, cache.pool)
+    ----------------------------------------------------------
+    Hit ratio and size(return dict):
+    > cache.stats()"""
+    def __init__(self, size = 4096):
+        self.size = size
+        self.schema = None
+        self.pool = Pool(True)
+        self.results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    def __len__(self):
+        return len(self.results)
+    def get(self, key):
+        try:
+            result = self.results[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self.results.move_to_end(key)
+        self.hits += 1
+        return True, result
+    def put(self, key, result):
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last = False)
+    def clear(self):
+        self.results.clear()
+        self.hits = 0
+        self.misses = 0
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, \
+            'ratio': self.hits / total if total > 0 else 0.0, \
+            'size': len(self.results), 'max_size': self.size}
+
+class Rule:
+    """Validation plan of one key, with the type names of the rules JSON
+    already resolved to Tag classes."""
+    # type name -> Tag classes, shared by the rules of every schema
+    resolved = {}
+    def __init__(self, rule):
+        self.type = rule['type']
+        self.union = '|' in self.type
+        if self.type not in Rule.resolved:
+            Rule.resolved[self.type] = tuple(Tag.str_to_class_name(i) \
+                for i in self.type.split('|'))
+        self.types = Rule.resolved[self.type]
+        self.tag_type = self.types[0]
+        self.values = None
+        self.range = None
+        if 'values' in rule:
+            try:
+                self.values = frozenset(rule['values'])
+            except TypeError:
+                self.values = tuple(rule['values'])
+        if 'range' in rule:
+            self.range = (rule['range']['min'], rule['range']['max'])
+        if self.tag_type is TagList:
+            self.count = rule['count']
+            self.subtype = rule['subtype']
+            if self.subtype not in Rule.resolved:
+                Rule.resolved[self.subtype] = (Tag.str_to_class_name(self.subtype), )
+            self.item_type = Rule.resolved[self.subtype][0]
+        elif issubclass(self.tag_type, TagArray):
+            self.subtype = self.tag_type.name.split()[0]
+            self.item_type = self.tag_type.kind
+    def describe_value(self):
+        temp = []
+        if self.values is not None:
+            temp.append('one of %s' % ', '.join(sorted(str(i) for i in self.values)))
+        if self.range is not None:
+            temp.append('between %s and %s' % self.range)
+        return ' and '.join(temp)
+    def check_value(self, tag):
+        if self.values is not None and not tag.value in self.values:
+            return False
+        if self.range is not None and \
+            not (tag.value >= self.range[0] and tag.value <= self.range[1]):
+            return False
+        return True
+    def check_packed(self, tag):
+        """True if the tag is a list or array kept in a PackedList and every
+        item has the item type and passes check_value, checked on the whole
+        array.array at once (min/max and a set). False means the items have
+        to be walked one by one to find the bad one."""
+        packed = tag.value
+        if not isinstance(packed, PackedList) or len(packed) == 0 or \
+            self.item_type is TagCompound or not packed[0].type_match(self.item_type):
+            return False
+        numbers = packed.array
+        if self.values is not None:
+            if not isinstance(self.values, frozenset) or not self.values.issuperset(numbers):
+                return False
+        if self.range is not None:
+            if numbers.typecode in 'fd':
+                # min/max skip a NaN depending on where it is, so leave
+                # any NaN (the sum is then NaN) to check_value
+                total = sum(numbers)
+                if total != total:
+                    return False
+            if min(numbers) < self.range[0] or max(numbers) > self.range[1]:
+                return False
+        return True
+
+class CompiledSchema:
+    """Rules JSON compiled once into a dict of base tag -> key -> Rule.
+
+    Build it once and pass it to check_compound_items instead of the raw
+    dict when checking many compounds."""
+    def __init__(self, rules):
+        self.rules = rules
+        self.plans = {}
+        for base_tag, items in rules.items():
+            self.plans[base_tag] = {key: Rule(rule) for key, rule in items.items()}
+    last = None
+    def of(rules):
+        """Compiled form of a rules dict, reused while the same dict object is
+        passed again. Do not modify the dict after checking with it."""
+        if CompiledSchema.last is None or CompiledSchema.last.rules is not rules:
+            CompiledSchema.last = CompiledSchema(rules)
+        return CompiledSchema.last
+    def __contains__(self, base_tag):
+        return base_tag in self.plans
+    def __getitem__(self, base_tag):
+        return self.rules[base_tag]
+    def keys(self):
+        return self.rules.keys()
+    def check(self, compound, base_tag, cache = None):
+        if cache is None:
+            return self.check_items(compound, base_tag, None)
+        if cache.schema is not self:
+            cache.clear()
+            cache.schema = self
+        text = cache.pool.sources.get(compound)
+        if text is None:
+            return self.check_items(compound, base_tag, cache)
+        key = (text, base_tag, Tag.strict)
+        found, result = cache.get(key)
+        if not found:
+            try:
+                self.check_items(compound, base_tag, cache)
+            except NbtException as error:
+                result = (error.reason, error.expected, list(error.trail))
+            cache.put(key, result)
+        if result is not None:
+            error = NbtException(result[0], expected = result[1])
+            error.trail.extend(result[2])
+            raise error
+    def check_items(self, compound, base_tag, cache):
+        plan = None
+        for key in compound.keys():
+            if plan is None:
+                if base_tag not in self.plans:
+                    raise NbtException('Unknown base tag %s' % base_tag)
+                plan = self.plans[base_tag]
+            if key not in plan:
+                raise NbtException('Unknown tag name', [key])
+            rule = plan[key]
+            tag = compound[key]
+
+            if rule.union:
+                match = False
+                for tag_type in rule.types:
+                    if tag.type_match(tag_type):
+                        match = True
+                        break
+                if not match:
+                    raise NbtException('Invalid tag type, should be %s', [key], \
+                        expected = rule.type)
+                continue
+            if not tag.type_match(rule.tag_type):
+                raise NbtException('Invalid tag type, should be %s', [key], \
+                    expected = rule.type)
+
+            if rule.tag_type is TagList:
+                if rule.count > 0 and len(tag) != rule.count:
+                    raise NbtException('Invalid number of items', [key])
+                if rule.check_packed(tag):
+                    continue
+                index = 0
+                for item in tag:
+                    if not item.type_match(rule.item_type):
+                        raise NbtException('Invalid item type, should be %s', \
+                            [key, index], expected = rule.subtype)
+                    if rule.item_type is TagCompound:
+                        try:
+                            self.check(item, rule.subtype, cache)
+                        except NbtException as error:
+                            error.add(key, index)
+                            raise
+                    elif not rule.check_value(item):
+                        raise NbtException('Invalid value', [key, index])
+                    index += 1
+            elif rule.tag_type is TagCompound:
+                try:
+                    self.check(tag, rule.type, cache)
+                except NbtException as error:
+                    error.add(key)
+                    raise
+            elif issubclass(rule.tag_type, TagArray):
+                if rule.check_packed(tag):
+                    continue
+                for item in tag:
+                    if not item.type_match(rule.item_type):
+                        raise NbtException('Invalid item type, should be %s', [key], \
+                            expected = rule.subtype)
+                    if not rule.check_value(item):
+                        raise NbtException('Invalid value', [key])
+            elif not rule.check_value(tag):
+                raise NbtException('Invalid value', [key])
+
+    def collect(self, compound, base_tag, path, errors, limit):
+        """Check the whole compound, appending a Diagnostic to errors for
+        every problem until there are limit of them."""
+        if base_tag not in self.plans:
+            if len(compound.keys()) > 0:
+                errors.append(Diagnostic('Unknown base tag %s' % base_tag, path, \
+                    base_tag, compound))
+            return
+        plan = self.plans[base_tag]
+        for key in compound.keys():
+            if len(errors) >= limit:
+                return
+            tag = compound[key]
+            if key not in plan:
+                errors.append(Diagnostic('Unknown tag name', path + [key], \
+                    'a tag of %s' % base_tag, tag))
+                continue
+            rule = plan[key]
+            raw = self.rules[base_tag][key]
 
-        if '|' in rules[base_tag][key]['type']:
             match = False
-            for type_name in rules[base_tag][key]['type'].split('|'):
-                if compound[key].type_match(Tag.str_to_class_name(type_name)):
+            for tag_type in rule.types:
+                if tag.type_match(tag_type):
                     match = True
                     break
             if not match:
-                raise NbtException('Invalid tag type, should be %s\nTag stack:\n>    %s'\
-                    % (rules[base_tag][key]['type'], key))
-            return
-        tag_type = Tag.str_to_class_name(rules[base_tag][key]['type'])
-        if not compound[key].type_match(tag_type):
-            raise NbtException('Invalid tag type, should be %s\nTag stack:\n>    %s'\
-                % (rules[base_tag][key]['type'], key))
-
-        if tag_type is TagList:
-            if rules[base_tag][key]['count'] > 0 and \
-                len(compound[key]) != rules[base_tag][key]['count']:
-                raise NbtException('Invalid number of items\nTag stack:\n>    %s' % key)
-            tag_type = Tag.str_to_class_name(rules[base_tag][key]['subtype'])
-            check_value = 'values' in rules[base_tag][key]
-            check_range = 'range' in rules[base_tag][key]
+                errors.append(Diagnostic('Invalid tag type, should be %s' % rule.type, \
+                    path + [key], rule.type, tag, raw))
+                continue
+            if rule.union:
+                continue
 
-            index = 0
-            for tag in compound[key]:
-                if not tag.type_match(tag_type):
-                    raise NbtException(\
-                        'Invalid item type, should be %s\nTag stack:\n>    %s[%d]' %\
-                        (rules[base_tag][key]['subtype'], key, index))
-                if tag_type is TagCompound:
-                    try:
-                        check_compound_items(rules, tag, rules[base_tag][key]['subtype'])
-                    except NbtException as error:
-                        raise NbtException('%s\n>    %s[%d]'%(error.message, key, index))
-                else:
-                    if check_value:
-                        if not tag.value in rules[base_tag][key]['values']:
-                            raise NbtException('Invalid value\nTag stack:\n>    %s[%d]'\
-                                % (key, index))
-                    if check_range:
-                        if not (tag.value >= rules[base_tag][key]['range']['min'] and \
-                            tag.value <= rules[base_tag][key]['range']['max']):
-                            raise NbtException('Invalid value\nTag stack:\n>    %s[%d]'\
-                                % (key, index))
-                index += 1
-        elif tag_type is TagCompound:
-            try:
-                check_compound_items(rules, compound[key], rules[base_tag][key]['type'])
-            except NbtException as error:
-                raise NbtException('%s\n>    %s' % (error.message, key))
-        elif tag_type is TagIntArray:
-            check_value = 'values' in rules[base_tag][key]
-            check_range = 'range' in rules[base_tag][key]
-            for tag in compound[key]:
-                if not tag.type_match(TagInt):
-                    raise NbtException(\
-                        'Invalid item type, should be int\nTag stack:\n>    %s' % key)
-                if check_value:
-                    if not tag.value in rules[base_tag][key]['values']:
-                        raise NbtException('Invalid value\nTag stack:\n>    %s' % key)
-                if check_range:
-                    if not (tag.value >= rules[base_tag][key]['range']['min'] and \
-                        tag.value <= rules[base_tag][key]['range']['max']):
-                        raise NbtException('Invalid value\nTag stack:\n>    %s' % key)
-        else:
-            if 'values' in rules[base_tag][key]:
-                if not compound[key].value in rules[base_tag][key]['values']:
-                    raise NbtException('Invalid value\nTag stack:\n>    %s' % key)
-            if 'range' in rules[base_tag][key]:
-                if not (compound[key].value >= rules[base_tag][key]['range']['min'] and \
-                    compound[key].value <= rules[base_tag][key]['range']['max']):
-                    raise NbtException('Invalid value\nTag stack:\n>    %s' % key)
+            if rule.tag_type is TagList:
+                if rule.count > 0 and len(tag) != rule.count:
+                    errors.append(Diagnostic('Invalid number of items', path + [key], \
+                        '%d items' % rule.count, tag, raw))
+                if rule.check_packed(tag):
+                    continue
+                index = 0
+                for item in tag:
+                    if len(errors) >= limit:
+                        return
+                    if not item.type_match(rule.item_type):
+                        errors.append(Diagnostic(\
+                            'Invalid item type, should be %s' % rule.subtype, \
+                            path + [key, index], rule.subtype, item, raw))
+                    elif rule.item_type is TagCompound:
+                        self.collect(item, rule.subtype, path + [key, index], errors, limit)
+                    elif not rule.check_value(item):
+                        errors.append(Diagnostic('Invalid value', path + [key, index], \
+                            rule.describe_value(), item, raw))
+                    index += 1
+            elif rule.tag_type is TagCompound:
+                self.collect(tag, rule.type, path + [key], errors, limit)
+            elif issubclass(rule.tag_type, TagArray):
+                if rule.check_packed(tag):
+                    continue
+                index = 0
+                for item in tag:
+                    if len(errors) >= limit:
+                        return
+                    if not item.type_match(rule.item_type):
+                        errors.append(Diagnostic(\
+                            'Invalid item type, should be %s' % rule.subtype, \
+                            path + [key, index], rule.subtype, item, raw))
+                    elif not rule.check_value(item):
+                        errors.append(Diagnostic('Invalid value', path + [key, index], \
+                            rule.describe_value(), item, raw))
+                    index += 1
+            elif not rule.check_value(tag):
+                errors.append(Diagnostic('Invalid value', path + [key], \
+                    rule.describe_value(), tag, raw))
+
+def check_compound_items(rules, compound, base_tag, cache = None):
+    """Raise NbtException on the first problem of the compound. With a
+    ValidationCache, a compound already checked against the same base tag
+    is not checked again."""
+    if not isinstance(rules, CompiledSchema):
+        rules = CompiledSchema.of(rules)
+    rules.check(compound, base_tag, cache)
+
+def collect_compound_errors(rules, compound, base_tag, limit = 100):
+    """Like check_compound_items, but return the list of all problems
+    (Diagnostic, at most limit of them) instead of raising on the first."""
+    if not isinstance(rules, CompiledSchema):
+        rules = CompiledSchema.of(rules)
+    errors = []
+    rules.collect(compound, base_tag, [], errors, limit)
+    return errors
@@ -0,0 +1,51 @@
+"""Import-time budget of the headless modules.
+
+Run the check(exit status 1 if it fails):
+> python test_imports.py
+
+snbt, rules, editor and region are imported in fresh processes, with
+byte code written. They must not import Qt, the style sheet or the
+modules snbt only imports when used (re, json, gzip), and the fastest
+import must be within the budget."""
+
+import os
+import subprocess
+import sys
+
+MODULES = ('snbt', 'rules', 'editor', 'region')
+BANNED = ('PyQt5', 'style', 'jobs', 're', 'json', 'gzip')
+BUDGET = 0.02
+
+def measure(runs = 11):
+    """Return (seconds of the fastest import, banned modules imported).
+    The first run only writes the byte code and is not counted."""
+    code = 'import sys, time\n' \
+        'start = time.perf_counter()\n' \
+        'import %s\n' \
+        'print(time.perf_counter() - start)\n' \
+        'print(" ".join(sorted(i for i in %r if i in sys.modules)))' % \
+        (', '.join(MODULES), BANNED)
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    folder = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    imported = set()
+    for i in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', code], cwd = folder, \
+            env = env, universal_newlines = True).split('\n')
+        times.append(float(output[0]))
+        imported.update(output[1].split())
+    return min(times[1:]), sorted(imported)
+
+def test_imports():
+    seconds, imported = measure()
+    assert len(imported) == 0, '%s imported' % ', '.join(imported)
+    assert seconds <= BUDGET, '%.1f ms, over the budget of %.0f ms' % \
+        (seconds * 1000, BUDGET * 1000)
+
+if __name__ == '__main__':
+    try:
+        test_imports()
+    except AssertionError as error:
+        sys.exit('imports: %s' % error)
+    print('imports: ok')